@@ -0,0 +1,606 @@
+# Lightweight stand-in for the bpy module so the add-on can be benchmarked
+# on a plain Python install without Blender.
+#
+# Only what the add-on touches is modelled: property groups and collections,
+# objects/actions/fcurves with keyframe_points (including foreach_get),
+# armatures with bone collections, timeline markers, handlers and timers.
+import os
+import sys
+import types
+from array import array
+
+
+# ---------------------------------------------------------------------------
+# bpy.props
+# ---------------------------------------------------------------------------
+
+class _Property:
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        self.kwargs = kwargs
+
+    def default(self):
+        if self.kind == "collection":
+            return PropertyCollection(self.kwargs.get("type"))
+        if self.kind == "pointer":
+            prop_type = self.kwargs.get("type")
+            if isinstance(prop_type, type) and issubclass(prop_type, PropertyGroup):
+                return prop_type()
+            return None
+        if "default" in self.kwargs:
+            default = self.kwargs["default"]
+            return list(default) if isinstance(default, (list, tuple)) else default
+        if self.kind == "enum":
+            items = self.kwargs["items"]
+            return set() if "ENUM_FLAG" in self.kwargs.get("options", ()) else items[0][0]
+        return {"bool": False, "int": 0, "float": 0.0, "string": ""}.get(self.kind)
+
+
+def _property_factory(kind):
+    def factory(**kwargs):
+        return _Property(kind, **kwargs)
+    return factory
+
+
+def _class_properties(cls):
+    # Cache the annotated properties of a class (including base classes)
+    cached = cls.__dict__.get("_fake_properties")
+    if cached is None:
+        cached = {}
+        for klass in reversed(cls.__mro__):
+            for name, annotation in getattr(klass, "__annotations__", {}).items():
+                if isinstance(annotation, _Property):
+                    cached[name] = annotation
+        cls._fake_properties = cached
+    return cached
+
+
+# ID property group: a copied dict with to_dict(), like Blender's IDPropertyGroup
+class IDPropertyGroup(dict):
+    def to_dict(self):
+        return {key: value.to_dict() if isinstance(value, IDPropertyGroup) else value
+                for key, value in self.items()}
+
+
+# Helper function to copy a value into ID property form, like assigning one in Blender
+# Int/float sequences become arrays (supporting the buffer protocol), dicts become groups.
+def _id_property(value):
+    if isinstance(value, dict):
+        group = IDPropertyGroup()
+        for key, item in value.items():
+            if item is None:
+                raise TypeError("ID properties cannot hold None")
+            group[str(key)] = _id_property(item)
+        return group
+    if isinstance(value, array):
+        return array('i' if value.typecode in "bBhHiIlLqQ" else 'd', value)
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, (int, float)) for v in value):
+        return array('i' if all(isinstance(v, int) for v in value) else 'd', value)
+    return value
+
+
+class PropertyGroup:
+    def __init__(self):
+        object.__setattr__(self, "_idprops", {})
+        for name, prop in _class_properties(type(self)).items():
+            object.__setattr__(self, name, prop.default())
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        prop = _class_properties(type(self)).get(name)
+        if prop is not None:
+            callback = prop.kwargs.get("update")
+            if callback is not None:
+                callback(self, sys.modules["bpy"].context)
+
+    # Item access bypasses update callbacks, like ID properties in Blender
+    def __getitem__(self, key):
+        if key in self._idprops:
+            return self._idprops[key]
+        if key in _class_properties(type(self)):
+            return object.__getattribute__(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _class_properties(type(self)):
+            object.__setattr__(self, key, value)
+        else:
+            self._idprops[key] = _id_property(value)
+
+    def __delitem__(self, key):
+        del self._idprops[key]
+
+    def __contains__(self, key):
+        return key in self._idprops
+
+    def get(self, key, default=None):
+        return self._idprops.get(key, default)
+
+    def keys(self):
+        return self._idprops.keys()
+
+    def as_pointer(self):
+        return id(self)
+
+
+class PropertyCollection:
+    def __init__(self, item_type=None, items=None):
+        self.item_type = item_type
+        self._items = list(items) if items is not None else []
+        # Number of items ever created, to measure RNA allocations
+        self.allocations = 0
+
+    def add(self):
+        item = self.item_type() if self.item_type is not None else types.SimpleNamespace()
+        self._items.append(item)
+        self.allocations += 1
+        return item
+
+    def remove(self, index):
+        del self._items[index]
+
+    def clear(self):
+        self._items.clear()
+
+    def move(self, from_index, to_index):
+        self._items.insert(to_index, self._items.pop(from_index))
+
+    def foreach_get(self, attr, seq):
+        values = []
+        for item in self._items:
+            value = getattr(item, attr)
+            if isinstance(value, (list, tuple)):
+                values.extend(value)
+            else:
+                values.append(value)
+        seq[:len(values)] = values
+
+    def foreach_set(self, attr, seq):
+        for item, value in zip(self._items, seq):
+            object.__setattr__(item, attr, type(getattr(item, attr))(value))
+
+    def get(self, name, default=None):
+        for item in self._items:
+            if getattr(item, "name", None) == name:
+                return item
+        return default
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            item = self.get(index)
+            if item is None:
+                raise KeyError(index)
+            return item
+        return self._items[index]
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __bool__(self):
+        return bool(self._items)
+
+
+# ---------------------------------------------------------------------------
+# Animation data
+# ---------------------------------------------------------------------------
+
+class Keyframe:
+    __slots__ = ("co",)
+
+    def __init__(self, frame, value):
+        self.co = (frame, value)
+
+
+class KeyframePoints:
+    # Keyframes are stored as one flat float array, like Blender does,
+    # so foreach_get("co") is a single buffer copy.
+    def __init__(self, points=()):
+        self._co = array('f')
+        for frame, value in points:
+            self._co.append(frame)
+            self._co.append(value)
+
+    def __len__(self):
+        return len(self._co) // 2
+
+    def __iter__(self):
+        co = self._co
+        return (Keyframe(co[i], co[i + 1]) for i in range(0, len(co), 2))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return Keyframe(self._co[index * 2], self._co[index * 2 + 1])
+
+    def foreach_get(self, attr, seq):
+        if attr != "co":
+            raise AttributeError(attr)
+        seq[:len(self._co)] = self._co
+
+    def insert(self, frame, value):
+        # Keep keys sorted by frame, replacing an existing key at the same frame
+        frames = self._co[0::2]
+        for i, existing in enumerate(frames):
+            if existing == frame:
+                self._co[i * 2 + 1] = value
+                return
+            if existing > frame:
+                self._co[i * 2:i * 2] = array('f', (frame, value))
+                return
+        self._co.extend((frame, value))
+
+
+class FCurve:
+    def __init__(self, data_path, array_index=0, points=()):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.keyframe_points = KeyframePoints(points)
+        self.mute = False
+
+    # Linear interpolation between keys is close enough for benchmarking
+    def evaluate(self, frame):
+        co = self.keyframe_points._co
+        if not co:
+            return 0.0
+        if frame <= co[0]:
+            return co[1]
+        # Binary search over the key frames (even indices)
+        lo, hi = 1, len(co) // 2
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if co[mid * 2] < frame:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(co) // 2:
+            return co[-1]
+        i = lo * 2
+        f0, v0, f1, v1 = co[i - 2], co[i - 1], co[i], co[i + 1]
+        t = (frame - f0) / ((f1 - f0) or 1.0)
+        return v0 + t * (v1 - v0)
+
+
+class ID:
+    _next_uid = 1
+
+    def __init__(self, name):
+        self.name = name
+        self._idprops = {}
+        self.session_uid = ID._next_uid
+        ID._next_uid += 1
+
+    @property
+    def name_full(self):
+        return self.name
+
+    @property
+    def original(self):
+        return self
+
+    def as_pointer(self):
+        return id(self)
+
+    def __getitem__(self, key):
+        return self._idprops[key]
+
+    def __setitem__(self, key, value):
+        self._idprops[key] = value
+
+    def __delitem__(self, key):
+        del self._idprops[key]
+
+    def __contains__(self, key):
+        return key in self._idprops
+
+    def get(self, key, default=None):
+        return self._idprops.get(key, default)
+
+
+class Action(ID):
+    def __init__(self, name, fcurves=()):
+        super().__init__(name)
+        self.fcurves = list(fcurves)
+
+    @property
+    def frame_range(self):
+        frames = [f for fcurve in self.fcurves for f in fcurve.keyframe_points._co[0::2]]
+        if not frames:
+            return (0.0, 0.0)
+        return (min(frames), max(frames))
+
+
+class NlaStrip:
+    def __init__(self, action, frame_start, scale=1.0, repeat=1.0, use_reverse=False,
+                 action_frame_start=None, action_frame_end=None):
+        self.type = 'CLIP'
+        self.action = action
+        self.mute = False
+        self.strips = []
+        frames = [keyframe.co[0] for fcurve in action.fcurves for keyframe in fcurve.keyframe_points] or [0.0]
+        self.action_frame_start = min(frames) if action_frame_start is None else action_frame_start
+        self.action_frame_end = max(frames) if action_frame_end is None else action_frame_end
+        self.scale = scale
+        self.repeat = repeat
+        self.use_reverse = use_reverse
+        self.frame_start = frame_start
+        length = self.action_frame_end - self.action_frame_start
+        self.frame_end = frame_start + length * scale * repeat
+
+
+class NlaTrack:
+    def __init__(self, strips=()):
+        self.strips = list(strips)
+        self.mute = False
+
+
+class AnimData:
+    def __init__(self, action=None):
+        self.action = action
+        self.nla_tracks = []
+        self.use_nla = True
+        self.use_tweak_mode = False
+        self.drivers = []
+
+
+class Bone:
+    def __init__(self, name):
+        self.name = name
+        self.layers = [False] * 32
+
+
+class BoneCollection:
+    def __init__(self, name, bones=(), is_visible=True):
+        self.name = name
+        self.bones = list(bones)
+        self.is_visible = is_visible
+
+
+class Armature(ID):
+    def __init__(self, name, bone_names=()):
+        super().__init__(name)
+        self.bones = PropertyCollection(None, [Bone(n) for n in bone_names])
+        self.collections = [BoneCollection("Visible", list(self.bones))]
+
+
+class PoseBone:
+    def __init__(self, name):
+        self.name = name
+        self.rotation_mode = 'QUATERNION'
+        self.location = [0.0, 0.0, 0.0]
+        self.rotation_quaternion = [1.0, 0.0, 0.0, 0.0]
+        self.rotation_euler = [0.0, 0.0, 0.0]
+        self.rotation_axis_angle = [0.0, 0.0, 1.0, 0.0]
+        self.scale = [1.0, 1.0, 1.0]
+        self.constraints = []
+
+
+class PoseBones(PropertyCollection):
+    def __init__(self, bones=()):
+        super().__init__(None, bones)
+        self._by_name = {bone.name: bone for bone in bones}
+
+    def get(self, name, default=None):
+        return self._by_name.get(name, default)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._by_name[key]
+        return super().__getitem__(key)
+
+
+class Pose:
+    def __init__(self, bone_names):
+        self.bones = PoseBones([PoseBone(name) for name in bone_names])
+
+
+class Object(ID):
+    def __init__(self, name, type='EMPTY', action=None, data=None):
+        super().__init__(name)
+        self.type = type
+        self.data = data
+        self.animation_data = AnimData(action) if action is not None else None
+        self.mode = 'OBJECT'
+        self.pose = Pose([bone.name for bone in data.bones]) if type == 'ARMATURE' and data is not None else None
+        self.children_recursive = []
+        self._selected = False
+
+    def select_set(self, state, view_layer=None):
+        self._selected = state
+
+    def select_get(self, view_layer=None):
+        return self._selected
+
+
+class TimelineMarker:
+    def __init__(self, name, frame):
+        self.name = name
+        self.frame = frame
+        self.select = False
+
+
+class TimelineMarkers(PropertyCollection):
+    def __init__(self):
+        super().__init__()
+        self._by_name = {}
+
+    def new(self, name, frame=0):
+        marker = TimelineMarker(name, frame)
+        self._items.append(marker)
+        self._by_name[name] = marker
+        self.allocations += 1
+        return marker
+
+    def remove(self, marker):
+        self._items.remove(marker)
+        self._by_name.pop(marker.name, None)
+
+    def clear(self):
+        self._items.clear()
+        self._by_name.clear()
+
+    def get(self, name, default=None):
+        return self._by_name.get(name, default)
+
+
+class Scene(ID):
+    def __init__(self, name="Scene"):
+        super().__init__(name)
+        self.objects = []
+        self.timeline_markers = TimelineMarkers()
+        self.frame_current = 1
+        self.frame_start = 1
+        self.frame_end = 250
+        self.use_preview_range = False
+        self.frame_preview_start = 1
+        self.frame_preview_end = 250
+        self.render = types.SimpleNamespace(fps=24, fps_base=1.0)
+        cascadeur_export = getattr(Scene, "cascadeur_export", None)
+        if isinstance(cascadeur_export, _Property):
+            self.cascadeur_export = cascadeur_export.default()
+
+    # Stands in for a full depsgraph evaluation: writes every animated pose bone channel
+    def frame_set(self, frame, subframe=0.0):
+        self.frame_current = frame
+        self.frame_set_calls = getattr(self, "frame_set_calls", 0) + 1
+        for obj in self.objects:
+            if obj.pose is None or obj.animation_data is None or obj.animation_data.action is None:
+                continue
+            for fcurve in obj.animation_data.action.fcurves:
+                if not fcurve.data_path.startswith('pose.bones["'):
+                    continue
+                bone_name, _, attr = fcurve.data_path[len('pose.bones["'):].partition('"].')
+                bone = obj.pose.bones.get(bone_name)
+                if bone is not None and hasattr(bone, attr):
+                    getattr(bone, attr)[fcurve.array_index] = fcurve.evaluate(frame + subframe)
+
+
+# ---------------------------------------------------------------------------
+# bpy.app
+# ---------------------------------------------------------------------------
+
+class Handlers:
+    NAMES = ("depsgraph_update_pre", "depsgraph_update_post", "frame_change_pre",
+             "frame_change_post", "load_pre", "load_post", "save_pre", "save_post",
+             "undo_pre", "undo_post", "redo_pre", "redo_post")
+
+    def __init__(self):
+        for name in self.NAMES:
+            setattr(self, name, [])
+
+    @staticmethod
+    def persistent(func):
+        func._bpy_persistent = True
+        return func
+
+
+class Timers:
+    def __init__(self):
+        self._timers = {}
+
+    def register(self, function, first_interval=0.0, persistent=False):
+        self._timers[function] = first_interval
+
+    def unregister(self, function):
+        if function not in self._timers:
+            raise ValueError("Timer not registered")
+        del self._timers[function]
+
+    def is_registered(self, function):
+        return function in self._timers
+
+    # Run registered timers until none are left (or max_ticks is reached)
+    def run(self, max_ticks=100000):
+        for _ in range(max_ticks):
+            if not self._timers:
+                return
+            for function in list(self._timers):
+                interval = function()
+                if interval is None:
+                    self._timers.pop(function, None)
+
+
+def _noop(*args, **kwargs):
+    return {'FINISHED'}
+
+
+# Install the fake bpy into sys.modules and return it
+def install(background=True):
+    bpy = types.ModuleType("bpy")
+
+    bpy_types = types.ModuleType("bpy.types")
+    bpy_types.Operator = type("Operator", (), {
+        "report": lambda self, level, message: None,
+        "bl_options": set(),
+    })
+    bpy_types.Panel = type("Panel", (), {})
+    bpy_types.Menu = type("Menu", (), {})
+    bpy_types.UIList = type("UIList", (), {"bitflag_filter_item": 1 << 30, "layout_type": 'DEFAULT'})
+    bpy_types.PropertyGroup = PropertyGroup
+    bpy_types.ID = ID
+    bpy_types.Object = Object
+    bpy_types.Action = Action
+    bpy_types.Armature = Armature
+    bpy_types.Scene = Scene
+    bpy_types.Window = type("Window", (), {})
+    bpy.types = bpy_types
+
+    props = types.ModuleType("bpy.props")
+    for kind, name in (("bool", "BoolProperty"), ("int", "IntProperty"), ("float", "FloatProperty"),
+                       ("string", "StringProperty"), ("enum", "EnumProperty"),
+                       ("pointer", "PointerProperty"), ("collection", "CollectionProperty"),
+                       ("int_vector", "IntVectorProperty"), ("float_vector", "FloatVectorProperty")):
+        setattr(props, name, _property_factory(kind))
+    bpy.props = props
+
+    bpy.utils = types.SimpleNamespace(
+        register_class=lambda cls: None,
+        unregister_class=lambda cls: None,
+        escape_identifier=lambda s: s.replace("\\", "\\\\").replace('"', '\\"'),
+    )
+    bpy.app = types.SimpleNamespace(
+        handlers=Handlers(),
+        timers=Timers(),
+        background=background,
+        version=(4, 1, 0),
+        binary_path="blender",
+    )
+    bpy.ops = types.SimpleNamespace(
+        object=types.SimpleNamespace(select_all=_noop, mode_set=_noop),
+    )
+    bpy.data = types.SimpleNamespace(filepath="", scenes=[], objects=[], actions=[])
+    bpy.path = types.SimpleNamespace(
+        abspath=lambda path: os.path.join(os.path.dirname(bpy.data.filepath), path[2:])
+        if path.startswith("//") else path,
+    )
+    bpy.msgbus = types.SimpleNamespace(
+        subscribe_rna=lambda **kwargs: None,
+        clear_by_owner=lambda owner: None,
+    )
+    bpy.context = types.SimpleNamespace(
+        scene=None,
+        selected_objects=[],
+        selected_pose_bones=[],
+        mode='OBJECT',
+        object=None,
+        view_layer=types.SimpleNamespace(objects=types.SimpleNamespace(active=None)),
+        window_manager=types.SimpleNamespace(windows=[]),
+    )
+
+    sys.modules["bpy"] = bpy
+    sys.modules["bpy.types"] = bpy_types
+    sys.modules["bpy.props"] = props
+    return bpy
+
+
+# Create a scene, add it to bpy.data and make it the context scene
+def new_scene(bpy, name="Scene"):
+    scene = Scene(name)
+    bpy.data.scenes.append(scene)
+    bpy.context.scene = scene
+    return scene
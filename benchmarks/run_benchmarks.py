@@ -0,0 +1,282 @@
+# Synthetic-scene benchmarks for the Blender to Cascadeur add-on
+#
+# Runs on plain Python with a fake bpy module (see fake_bpy.py), so no Blender is needed:
+#   python benchmarks/run_benchmarks.py --output bench.json
+#   python benchmarks/run_benchmarks.py --sizes 10 1000 100000 --repeat 5
+#
+# Sizes are the total number of keys in the synthetic action. Results are written
+# as JSON so runs can be compared to spot regressions.
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fake_bpy
+
+bpy = fake_bpy.install()
+
+import blender_to_cascadeur as addon
+from blender_to_cascadeur import keyframe_index
+from blender_to_cascadeur import keyframe_operators
+from blender_to_cascadeur import pose_detection
+from blender_to_cascadeur import pose_eval
+from blender_to_cascadeur import utils
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+
+# Helper function to build a scene with one armature whose action holds `size` keys
+# Keys are spread so the action has about size / 2 unique frames.
+def build_scene(size, bones=None):
+    scene = fake_bpy.new_scene(bpy, f"Bench_{size}")
+    fcurve_count = max(1, min(600, size // 20))
+    bone_count = bones or max(1, fcurve_count // 10)
+    keys_per_fcurve = max(1, size // fcurve_count)
+
+    fcurves = []
+    for i in range(fcurve_count):
+        bone = f"bone_{i % bone_count:03d}"
+        points = [((k * fcurve_count + i) // 2 + 1, float(k % 7)) for k in range(keys_per_fcurve)]
+        fcurves.append(fake_bpy.FCurve(f'pose.bones["{bone}"].location', i % 3, points))
+
+    action = fake_bpy.Action(f"Action_{size}", fcurves)
+    armature_data = fake_bpy.Armature(f"Armature_{size}", [f"bone_{b:03d}" for b in range(bone_count)])
+    armature = fake_bpy.Object(f"rig_{size}", 'ARMATURE', action, armature_data)
+    scene.objects.append(armature)
+    scene.cascadeur_export.armature = armature
+    return scene
+
+# Helper function to reset every cache of the add-on between cold runs
+def reset_caches():
+    keyframe_index.clear()
+    utils.reset_marker_sync()
+    utils.reset_marked_stores()
+    keyframe_operators.CASCADEUR_UL_keyframe_list._filter_cache.clear()
+    keyframe_operators.CASCADEUR_UL_keyframe_list._search_index.clear()
+
+# Time a function; setup runs before every repetition and is not timed
+def measure(func, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return {
+        "best_ms": min(times),
+        "mean_ms": sum(times) / len(times),
+        "max_ms": max(times),
+    }
+
+def bench_size(size, repeat):
+    results = {}
+    scene = build_scene(size)
+    context = bpy.context
+    settings = scene.cascadeur_export
+    items = settings.keyframe_items
+    armature = settings.armature
+    frames = utils.find_all_keyframes(context, armature)
+
+    # Keyframe scanning
+    results["find_all_keyframes_cold"] = measure(
+        lambda: utils.find_all_keyframes(context, armature), repeat, setup=keyframe_index.clear)
+    results["find_all_keyframes_warm"] = measure(
+        lambda: utils.find_all_keyframes(context, armature), repeat)
+
+    # Keyframe list
+    def empty_list():
+        reset_caches()
+        items.clear()
+    results["update_keyframe_list_full"] = measure(lambda: utils.update_keyframe_list(scene), repeat, setup=empty_list)
+    results["update_keyframe_list_unchanged"] = measure(lambda: utils.update_keyframe_list(scene), repeat)
+
+    # Paginated list: one page of items, switching pages
+    def paginated_list():
+        settings["paginate_list"] = True
+        settings["list_page"] = 0
+        utils.update_keyframe_list(scene)
+    results["update_keyframe_list_paginated"] = measure(paginated_list, repeat, setup=empty_list)
+    def next_page():
+        info = utils.get_keyframe_page_info(scene)
+        utils.update_keyframe_page(scene, page=(info[0] + 1) % info[1])
+    results["keyframe_list_next_page"] = measure(next_page, repeat)
+    settings["paginate_list"] = False
+    utils.update_keyframe_list(scene)
+    
+    # Timeline markers
+    marked = {str(f): {} for f in frames[::2]}
+    def fresh_markers():
+        reset_caches()
+        scene.timeline_markers.clear()
+        utils.get_marked_store(scene).bulk_update(replace=marked.keys())
+    results["update_timeline_markers_full"] = measure(
+        lambda: utils.update_timeline_markers(scene), repeat, setup=fresh_markers)
+
+    def toggle_one_mark():
+        store = utils.get_marked_store(scene)
+        if not store.remove(frames[0]):
+            store.add(frames[0])
+    results["update_timeline_markers_one_change"] = measure(
+        lambda: utils.update_timeline_markers(scene), repeat, setup=toggle_one_mark)
+    results["update_on_frame_change_unchanged"] = measure(lambda: utils.update_on_frame_change(scene), repeat)
+
+    # UIList filtering
+    utils.update_keyframe_list(scene)
+    ui_list = keyframe_operators.CASCADEUR_UL_keyframe_list()
+    def filter_list():
+        ui_list.filter_items(context, settings, "keyframe_items")
+    def set_filter():
+        keyframe_operators.CASCADEUR_UL_keyframe_list._filter_cache.clear()
+        keyframe_operators.CASCADEUR_UL_keyframe_list._search_index.clear()
+        settings.list_filter.filter_string = "1"
+        settings.list_filter.filter_state = 'MARKED'
+    results["filter_items_cold"] = measure(filter_list, repeat, setup=set_filter)
+    results["filter_items_cached"] = measure(filter_list, repeat)
+    settings.list_filter.filter_string = ""
+    settings.list_filter.filter_state = 'ALL'
+
+    # Operators
+    def run_operator(cls, **props):
+        op = cls()
+        for name, value in props.items():
+            setattr(op, name, value)
+        result = op.execute(context)
+        if result != {'FINISHED'}:
+            raise RuntimeError(f"{cls.__name__} returned {result}")
+
+    def go_to_keyed_frame():
+        scene.frame_current = frames[len(frames) // 2]
+    results["mark_keyframe"] = measure(
+        lambda: run_operator(keyframe_operators.CASCADEUR_OT_mark_keyframe), repeat, setup=go_to_keyed_frame)
+    results["mark_all_keyframes"] = measure(
+        lambda: run_operator(keyframe_operators.CASCADEUR_OT_mark_all_keyframes), repeat)
+
+    state = {"on": False}
+    def flip():
+        state["on"] = not state["on"]
+    results["toggle_keyframe_item"] = measure(
+        lambda: run_operator(keyframe_operators.CASCADEUR_OT_toggle_keyframe_item,
+                             frame=frames[len(frames) // 3], toggle_state=state["on"]),
+        repeat, setup=flip)
+
+    # A burst of 50 toggles with the refresh scheduler running on timers, like in the UI
+    toggle_frames = frames[:50]
+    def toggle_burst():
+        bpy.app.background = False
+        try:
+            for i, frame in enumerate(toggle_frames):
+                run_operator(keyframe_operators.CASCADEUR_OT_toggle_keyframe_item,
+                             frame=frame, toggle_state=bool(i % 2))
+            bpy.app.timers.run()
+        finally:
+            bpy.app.background = True
+    results["toggle_keyframe_item_burst_50"] = measure(toggle_burst, repeat)
+
+    def mark_everything():
+        utils.set_marked_keyframes(scene, marked)
+    results["clear_all_keyframes"] = measure(
+        lambda: run_operator(keyframe_operators.CASCADEUR_OT_clear_all_keyframes), repeat, setup=mark_everything)
+
+    bpy.data.scenes.remove(scene)
+    reset_caches()
+    return {"size": size, "unique_frames": len(frames), "results": results}
+
+# Helper function to build a shot with moving bones for key pose detection
+# Every bone gets location and quaternion rotation keys every 10 frames.
+def build_shot(frames, bones):
+    scene = fake_bpy.new_scene(bpy, f"Shot_{frames}x{bones}")
+    scene.frame_start, scene.frame_end = 1, frames
+    fcurves = []
+    for b in range(bones):
+        bone = f"bone_{b:03d}"
+        for index in range(3):
+            points = [(float(f), float((f * (b + index + 1)) % 17)) for f in range(1, frames + 1, 10)]
+            fcurves.append(fake_bpy.FCurve(f'pose.bones["{bone}"].location', index, points))
+        for index in range(4):
+            points = [(float(f), 1.0 if index == 0 else ((f + b * index) % 13) / 13.0) for f in range(1, frames + 1, 10)]
+            fcurves.append(fake_bpy.FCurve(f'pose.bones["{bone}"].rotation_quaternion', index, points))
+    action = fake_bpy.Action(f"ShotAction_{frames}", fcurves)
+    armature_data = fake_bpy.Armature(f"ShotArmature_{frames}", [f"bone_{b:03d}" for b in range(bones)])
+    armature = fake_bpy.Object(f"shot_rig_{frames}", 'ARMATURE', action, armature_data)
+    scene.objects.append(armature)
+    scene.cascadeur_export.armature = armature
+    return scene
+
+def bench_detect_key_poses(frames, bones, repeat):
+    scene = build_shot(frames, bones)
+    armature = scene.cascadeur_export.armature
+    bone_names = {f"bone_{b:03d}" for b in range(bones)}
+    poses = pose_detection.detect_key_poses(armature.animation_data.action, bone_names, 1, frames)
+    result = measure(lambda: pose_detection.detect_key_poses(
+        armature.animation_data.action, bone_names, 1, frames), repeat)
+    bpy.data.scenes.remove(scene)
+    reset_caches()
+    return {"frames": frames, "bones": bones, "poses": len(poses), "results": {"detect_key_poses": result}}
+
+def bench_evaluate_poses(frames, bones, marked, repeat):
+    scene = build_shot(frames, bones)
+    armature = scene.cascadeur_export.armature
+    marked_frames = list(range(1, frames + 1, max(1, frames // marked)))[:marked]
+    scene.frame_set_calls = 0
+    result = measure(lambda: pose_eval.evaluate_poses(scene, armature, marked_frames), repeat)
+    frame_sets = scene.frame_set_calls
+    bpy.data.scenes.remove(scene)
+    reset_caches()
+    return {"frames": len(marked_frames), "bones": bones, "frame_set_calls": frame_sets,
+            "results": {"evaluate_poses": result}}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Blender to Cascadeur add-on with a fake bpy")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Total keys per synthetic action")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per benchmark")
+    parser.add_argument("--output", "-o", default=None, help="Write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    addon.register()
+    try:
+        runs = []
+        for size in args.sizes:
+            start = time.perf_counter()
+            run = bench_size(size, args.repeat)
+            print(f"size {size:>7}: {time.perf_counter() - start:6.2f}s", file=sys.stderr)
+            runs.append(run)
+        detection = None
+        poses = None
+        if pose_detection.is_available():
+            detection = bench_detect_key_poses(2000, 600, args.repeat)
+            print(f"detect_key_poses 2000x600: {detection['results']['detect_key_poses']['best_ms']:.1f} ms",
+                  file=sys.stderr)
+            poses = bench_evaluate_poses(2000, 600, 50, args.repeat)
+            print(f"evaluate_poses 50 frames x 600 bones: {poses['results']['evaluate_poses']['best_ms']:.1f} ms",
+                  file=sys.stderr)
+    finally:
+        addon.unregister()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": getattr(keyframe_index.np, "__version__", None),
+        "repeat": args.repeat,
+        "runs": runs,
+        "detection": detection,
+        "pose_evaluation": poses,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
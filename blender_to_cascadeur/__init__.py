@@ -9,42 +9,102 @@ bl_info = {
 }
 
 import bpy
+import time
 from . import properties
 from . import keyframe_operators
 from . import export_operators
 from . import ui
 from . import utils
+from . import keyframe_index
+from . import profiling_operators
+from . import refresh_scheduler
+from . import profiling
+from . import pose_snapshot
+from . import metadata_writer
+from . import keyframe_scan
 
 # Registration
 def register():
+    start = time.perf_counter()
     properties.register()
     keyframe_operators.register()
     export_operators.register()
+    profiling_operators.register()
     ui.register()
+    keyframe_index.register()
+    refresh_scheduler.register()
+    keyframe_scan.register()
     
-    # Add handler for initial scene properties setup only
-    if utils.initialize_scene_properties not in bpy.app.handlers.depsgraph_update_post:
-        bpy.app.handlers.depsgraph_update_post.append(utils.initialize_scene_properties)
+    # Forget marker sync state and in-memory marks whenever scene data is reloaded
+    # (registered before on_file_loaded, so the resets never wipe what it sets up)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if utils.reset_marker_sync not in handlers:
+            handlers.append(utils.reset_marker_sync)
+        if utils.reset_marked_stores not in handlers:
+            handlers.append(utils.reset_marked_stores)
+        if keyframe_operators.reset_list_caches not in handlers:
+            handlers.append(keyframe_operators.reset_list_caches)
+        if utils.reset_keyframe_list_frames not in handlers:
+            handlers.append(utils.reset_keyframe_list_frames)
+    
+    # One-shot scene setup on file load and on scene switches - nothing on the depsgraph hot path
+    if utils.on_file_loaded not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(utils.on_file_loaded)
+    utils.subscribe_scene_changes()
     
     # Add handler for frame change to update markers only when needed
     if utils.update_on_frame_change not in bpy.app.handlers.frame_change_post:
         bpy.app.handlers.frame_change_post.append(utils.update_on_frame_change)
+    
+    # Write pending marks into the scene property before saving
+    if utils.flush_all_marked_stores not in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.append(utils.flush_all_marked_stores)
+    
+    # Initialize the scenes that are already open on the first tick after registration
+    if not bpy.app.timers.is_registered(utils.initialize_after_register):
+        bpy.app.timers.register(utils.initialize_after_register, first_interval=0.0)
+    
+    elapsed = time.perf_counter() - start
+    profiling.record("register", elapsed)
+    print(f"Blender to Cascadeur registered in {elapsed * 1000.0:.1f} ms")
 
 def unregister():
     # Remove handlers
-    if utils.initialize_scene_properties in bpy.app.handlers.depsgraph_update_post:
-        bpy.app.handlers.depsgraph_update_post.remove(utils.initialize_scene_properties)
+    if utils.on_file_loaded in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(utils.on_file_loaded)
+    utils.unsubscribe_scene_changes()
+    if bpy.app.timers.is_registered(utils.initialize_after_register):
+        bpy.app.timers.unregister(utils.initialize_after_register)
     
     if utils.update_on_frame_change in bpy.app.handlers.frame_change_post:
         bpy.app.handlers.frame_change_post.remove(utils.update_on_frame_change)
     
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if utils.reset_marker_sync in handlers:
+            handlers.remove(utils.reset_marker_sync)
+        if utils.reset_marked_stores in handlers:
+            handlers.remove(utils.reset_marked_stores)
+        if keyframe_operators.reset_list_caches in handlers:
+            handlers.remove(keyframe_operators.reset_list_caches)
+        if utils.reset_keyframe_list_frames in handlers:
+            handlers.remove(utils.reset_keyframe_list_frames)
+    
+    if utils.flush_all_marked_stores in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(utils.flush_all_marked_stores)
+    
+    # Make sure nothing pending is lost (background metadata writes included)
+    metadata_writer.wait_all()
+    keyframe_scan.unregister()
+    refresh_scheduler.unregister()
+    utils.flush_all_marked_stores()
+    
     # Clear all timeline markers
     for scene in bpy.data.scenes:
-        for marker in list(scene.timeline_markers):
-            if marker.name.startswith("Key:"):
-                scene.timeline_markers.remove(marker)
+        utils.clear_timeline_markers(scene)
     
+    keyframe_index.unregister()
     ui.unregister()
+    profiling_operators.unregister()
     export_operators.unregister()
     keyframe_operators.unregister()
     properties.unregister()
@@ -0,0 +1,254 @@
+# Headless batch export for many .blend files
+#
+# Usage (controller, fans out one Blender worker process per .blend file):
+#   blender --background --python blender_to_cascadeur/batch_export.py -- \
+#       shot_010.blend shot_020.blend --output ./export --jobs 4 [--scene NAME] [--armature NAME]
+#
+# Each worker opens its .blend file, writes <blend>_<scene>_<armature>_keyframes.json
+# (an FBX when the FBX exporter is available, and a pose snapshot with --poses)
+# and reports timings back to the controller, which prints a per-file summary at the end.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Helper function to get the arguments meant for this script (everything after "--")
+def _script_argv(argv):
+    if "--" in argv:
+        return argv[argv.index("--") + 1:]
+    return []
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="batch_export.py",
+        description="Export Cascadeur keyframe metadata from many .blend files",
+    )
+    parser.add_argument("blend_files", nargs="*", help=".blend files to export")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Output directory (default: next to each .blend file)")
+    parser.add_argument("--scene", action="append", default=[],
+                        help="Scene to export, may be given several times (default: all scenes)")
+    parser.add_argument("--armature", action="append", default=[],
+                        help="Armature to export, may be given several times "
+                             "(default: the armature picked in the panel, else all armatures)")
+    parser.add_argument("--jobs", "-j", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Number of Blender worker processes")
+    parser.add_argument("--mark-all", action="store_true",
+                        help="Export every keyframe when a scene has no marked keyframes")
+    parser.add_argument("--no-fbx", action="store_true", help="Only write the keyframe metadata")
+    parser.add_argument("--poses", action="store_true",
+                        help="Also write a pose snapshot (<name>_poses.json + .npy) of the marked frames")
+    parser.add_argument("--blender", default=None,
+                        help="Blender executable (default: the running Blender)")
+    parser.add_argument("--summary", default=None, help="Also write the summary as JSON to this file")
+    # Internal: run as a worker inside an opened .blend file
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+# ---------------------------------------------------------------------------
+# Worker side - runs inside Blender with the .blend file already loaded
+# ---------------------------------------------------------------------------
+
+# Helper function to import the add-on package from a script run with --python
+def _import_addon():
+    if __package__:
+        return sys.modules[__package__]
+    addon_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if addon_parent not in sys.path:
+        sys.path.insert(0, addon_parent)
+    import blender_to_cascadeur
+    return blender_to_cascadeur
+
+# Helper function to pick the armatures to export from a scene
+def _scene_armatures(scene, armature_names):
+    if armature_names:
+        return [obj for obj in scene.objects if obj.type == 'ARMATURE' and obj.name in armature_names]
+    settings = scene.cascadeur_export
+    if settings.multi_armature and settings.armature_targets:
+        return [target.armature for target in settings.armature_targets if target.enabled and target.armature]
+    if scene.cascadeur_export.armature:
+        return [scene.cascadeur_export.armature]
+    return [obj for obj in scene.objects if obj.type == 'ARMATURE']
+
+def run_worker(args):
+    import bpy
+    addon = _import_addon()
+    if not hasattr(bpy.types.Scene, "cascadeur_export"):
+        addon.register()
+    utils = addon.utils
+    keyframe_index = addon.keyframe_index
+
+    blend_path = bpy.data.filepath
+    blend_name = os.path.splitext(os.path.basename(blend_path))[0] or "untitled"
+    output_dir = args.output or os.path.dirname(blend_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    tasks = []
+    scenes = [s for s in bpy.data.scenes if not args.scene or s.name in args.scene]
+    for scene in scenes:
+        marked_keyframes = utils.get_marked_keyframes(scene)
+        # --mark-all scans armatures sharing an action only once
+        collector = keyframe_index.ActionCollector(utils.get_subframe_tolerance(scene))
+
+        # In multi-armature mode every target has its own marks
+        target_keyframes = {}
+        if scene.cascadeur_export.multi_armature:
+            for target in scene.cascadeur_export.armature_targets:
+                if target.armature:
+                    target_keyframes[target.armature.name] = utils.get_target_store(scene, target).to_dict()
+
+        for armature in _scene_armatures(scene, args.armature):
+            task = {"scene": scene.name, "armature": armature.name, "files": [], "error": None}
+            start = time.perf_counter()
+            try:
+                keyframes = target_keyframes.get(armature.name, marked_keyframes)
+                if not keyframes and args.mark_all:
+                    keyframes = {str(f): {} for f in sorted(collector.collect(armature))}
+                task["keyframes"] = len(keyframes)
+                if not keyframes:
+                    raise RuntimeError("No marked keyframes (use --mark-all to export every keyframe)")
+
+                base = os.path.join(output_dir, utils.safe_file_name(f"{blend_name}_{scene.name}_{armature.name}"))
+                metadata_path = utils.write_keyframe_metadata(f"{base}_keyframes.json", keyframes)
+                task["files"].append(metadata_path)
+
+                if args.poses:
+                    frames = sorted(int(frame) for frame in keyframes)
+                    bone_names, data = addon.pose_snapshot.sample_poses(scene, armature, frames)
+                    fps = scene.render.fps / scene.render.fps_base
+                    task["files"].extend(addon.pose_snapshot.write_pose_snapshot(
+                        metadata_path, bone_names, frames, data, armature_name=armature.name, fps=fps))
+
+                if not args.no_fbx:
+                    fbx_path = utils.export_armature_fbx(scene, armature, f"{base}.fbx")
+                    if fbx_path:
+                        task["files"].append(fbx_path)
+            except Exception as e:
+                task["error"] = str(e)
+            task["seconds"] = time.perf_counter() - start
+            tasks.append(task)
+        collector.report()
+
+    if not tasks:
+        tasks.append({"scene": None, "armature": None, "files": [], "seconds": 0.0,
+                      "error": "No matching scenes or armatures"})
+
+    if args.result:
+        with open(args.result, "w") as f:
+            json.dump(tasks, f)
+    return tasks
+
+# ---------------------------------------------------------------------------
+# Controller side - fans .blend files out over Blender worker processes
+# ---------------------------------------------------------------------------
+
+def _blender_binary(args):
+    if args.blender:
+        return args.blender
+    try:
+        import bpy
+        return bpy.app.binary_path
+    except ImportError:
+        raise SystemExit("Not running inside Blender, pass --blender /path/to/blender")
+
+# Run one worker process for one .blend file and collect its result
+def _run_file(blender, order, blend_file, args):
+    fd, result_path = tempfile.mkstemp(prefix="btc_batch_", suffix=".json")
+    os.close(fd)
+
+    command = [blender, "--background", "--factory-startup", blend_file,
+               "--python", os.path.abspath(__file__), "--", "--worker", "--result", result_path]
+    if args.output:
+        command += ["--output", os.path.abspath(args.output)]
+    for name in args.scene:
+        command += ["--scene", name]
+    for name in args.armature:
+        command += ["--armature", name]
+    if args.mark_all:
+        command.append("--mark-all")
+    if args.no_fbx:
+        command.append("--no-fbx")
+    if args.poses:
+        command.append("--poses")
+
+    start = time.perf_counter()
+    proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    elapsed = time.perf_counter() - start
+
+    summary = {"order": order, "file": blend_file, "seconds": elapsed, "returncode": proc.returncode, "tasks": [], "error": None}
+    try:
+        with open(result_path) as f:
+            summary["tasks"] = json.load(f)
+    except (OSError, ValueError):
+        # Worker died before writing its result - keep the tail of its log
+        summary["error"] = f"Worker failed (exit code {proc.returncode}): {proc.stdout[-2000:].strip()}"
+    finally:
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+    if summary["error"] is None:
+        errors = [t["error"] for t in summary["tasks"] if t.get("error")]
+        if errors:
+            summary["error"] = "; ".join(errors)
+    return summary
+
+def _print_summary(results, total_seconds):
+    print("")
+    print("Cascadeur batch export summary")
+    print("-" * 72)
+    for result in results:
+        status = "OK" if not result["error"] else "FAILED"
+        exported = sum(1 for t in result["tasks"] if not t.get("error"))
+        print(f"{status:6} {result['seconds']:8.2f}s  {exported} export(s)  {result['file']}")
+        for task in result["tasks"]:
+            line = f"         {task.get('seconds', 0.0):8.2f}s  {task['scene']} / {task['armature']}"
+            if task.get("error"):
+                line += f"  ERROR: {task['error']}"
+            print(line)
+        if result["error"] and not result["tasks"]:
+            print(f"         ERROR: {result['error']}")
+    failed = sum(1 for r in results if r["error"])
+    print("-" * 72)
+    print(f"{len(results)} file(s), {failed} failed, {total_seconds:.2f}s total")
+
+def run_controller(args):
+    if not args.blend_files:
+        raise SystemExit("No .blend files given")
+    blender = _blender_binary(args)
+
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(_run_file, blender, i, os.path.abspath(path), args)
+                   for i, path in enumerate(args.blend_files)]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"[{len(results) + 1}/{len(futures)}] {'OK' if not result['error'] else 'FAILED'}: {result['file']}")
+            results.append(result)
+    total_seconds = time.perf_counter() - start
+
+    results.sort(key=lambda r: r["order"])
+    _print_summary(results, total_seconds)
+
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({"seconds": total_seconds, "files": results}, f, indent=2)
+    return results
+
+def main(argv=None):
+    args = _parse_args(_script_argv(sys.argv if argv is None else argv))
+    if args.worker:
+        tasks = run_worker(args)
+        return 1 if any(t.get("error") for t in tasks) else 0
+    results = run_controller(args)
+    return 1 if any(r["error"] for r in results) else 0
+
+if __name__ == "__main__":
+    code = main()
+    # Blender keeps running after --python unless told otherwise
+    sys.exit(code)
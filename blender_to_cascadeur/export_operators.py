@@ -1,9 +1,11 @@
 import bpy
-import json
 import os
+import time
 from bpy.types import Operator
-from bpy.props import StringProperty
+from bpy.props import StringProperty, BoolProperty
 from . import utils
+from . import profiling
+from . import pose_snapshot
 
 # Operator để chọn armature
 class CASCADEUR_OT_select_armature(Operator):
@@ -182,8 +184,7 @@ class CASCADEUR_OT_export_unified(Operator):
             return {'CANCELLED'}
             
         # Kiểm tra xem có keyframes nào được đánh dấu không
-        marked_keyframes = utils.get_marked_keyframes(context.scene)
-        if not marked_keyframes:
+        if not len(utils.get_marked_store(context.scene)):
             self.report({'WARNING'}, "No keyframes are marked. Please mark keyframes before exporting.")
             return {'CANCELLED'}
         
@@ -209,49 +210,257 @@ class CASCADEUR_OT_export_unified(Operator):
             # Xuất metadata JSON
             marked_keyframes = utils.get_marked_keyframes(context.scene)
             
-            # Thêm phần mở rộng .json nếu không có
-            filepath = self.filepath
-            if not filepath.lower().endswith('.json'):
-                filepath += '.json'
-            
-            # Tạo thư mục nếu không tồn tại
-            directory = os.path.dirname(filepath)
-            if directory and not os.path.exists(directory):
-                os.makedirs(directory)
-            
-            # Ghi file metadata
-            with open(filepath, 'w') as f:
-                json.dump(marked_keyframes, f, indent=2)
-            
-            self.report({'INFO'}, f"Exported keyframe metadata to {filepath}")
-            
             # Đảm bảo chúng ta ở chế độ object trước khi tiếp tục
             if context.object and context.object.mode != 'OBJECT':
                 bpy.ops.object.mode_set(mode='OBJECT')
             
-            # Giờ mở panel xuất ARP với độ trễ sử dụng bộ hẹn giờ
-            # Điều này giúp đảm bảo bối cảnh được cập nhật sau khi trình duyệt file đóng
-            def open_arp_export_delayed():
+            # Khi ghi xong (chạy trên luồng chính): báo lỗi cho người dùng,
+            # chỉ mở panel xuất ARP khi file metadata đã được ghi thành công
+            def on_written(job):
+                if job.error is not None:
+                    def draw_error(menu, context):
+                        menu.layout.label(text=f"Could not write {job.filepath}:")
+                        menu.layout.label(text=str(job.error))
+                    bpy.context.window_manager.popup_menu(draw_error, title="Error exporting metadata", icon='ERROR')
+                    return
                 bpy.ops.cascadeur.open_arp_export('INVOKE_DEFAULT')
-                return None  # Xóa bộ hẹn giờ
-                
-            bpy.app.timers.register(open_arp_export_delayed, first_interval=0.5)
+            
+            # Ghi file metadata ở luồng nền (tự thêm .json và tạo thư mục nếu cần)
+            # File được ghi vào file tạm rồi đổi tên, Blender vẫn dùng được trong lúc ghi
+            job = utils.write_keyframe_metadata_async(bpy.path.abspath(self.filepath), marked_keyframes, on_done=on_written)
+            
+            self.report({'INFO'}, f"Writing keyframe metadata to {job.filepath}")
             
             return {'FINISHED'}
         except Exception as e:
             self.report({'ERROR'}, f"Error exporting metadata: {e}")
             return {'CANCELLED'}
 
+# Operator để xuất pose tại các frame đã đánh dấu (không cần xuất FBX)
+class CASCADEUR_OT_export_pose_snapshot(Operator):
+    bl_idname = "cascadeur.export_pose_snapshot"
+    bl_label = "Export Key Poses"
+    bl_description = "Export keyframe metadata and the bone poses at the marked frames (no FBX)"
+    
+    filepath: StringProperty(
+        name="Save Path",
+        description="Path to save the metadata file",
+        default="//",
+        subtype='FILE_PATH'
+    )
+    
+    def invoke(self, context, event):
+        # Kiểm tra xem armature có được chọn không
+        if not context.scene.cascadeur_export.armature:
+            self.report({'WARNING'}, "No armature selected. Please select an armature first.")
+            return {'CANCELLED'}
+            
+        # Kiểm tra xem có keyframes nào được đánh dấu không
+        if not len(utils.get_marked_store(context.scene)):
+            self.report({'WARNING'}, "No keyframes are marked. Please mark keyframes before exporting.")
+            return {'CANCELLED'}
+        
+        # Đặt tên file mặc định dựa trên file blend
+        blend_path = bpy.data.filepath
+        if blend_path:
+            dir_path = os.path.dirname(blend_path)
+            filename = os.path.splitext(os.path.basename(blend_path))[0]
+            self.filepath = os.path.join(dir_path, f"{filename}_keyframes.json")
+        else:
+            self.filepath = "//"
+        
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def execute(self, context):
+        scene = context.scene
+        armature = scene.cascadeur_export.armature
+        if not armature:
+            self.report({'WARNING'}, "No armature selected. Please select an armature first.")
+            return {'CANCELLED'}
+        
+        try:
+            # Ghi metadata JSON như khi xuất thông thường
+            store = utils.get_marked_store(scene)
+            filepath = utils.write_keyframe_metadata(bpy.path.abspath(self.filepath), store.to_dict())
+            
+            # Lấy pose tại các frame đã đánh dấu và ghi file nhị phân kèm theo
+            frames = list(store)
+            bone_names, data = pose_snapshot.sample_poses(scene, armature, frames)
+            fps = scene.render.fps / scene.render.fps_base
+            header_path, data_path = pose_snapshot.write_pose_snapshot(
+                filepath, bone_names, frames, data, armature_name=armature.name, fps=fps)
+            
+            self.report({'INFO'}, f"Exported {len(frames)} poses to {data_path}")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Error exporting poses: {e}")
+            return {'CANCELLED'}
+
+# Operator để thêm các armature đang chọn vào danh sách nhiều armature
+class CASCADEUR_OT_add_armature_targets(Operator):
+    bl_idname = "cascadeur.add_armature_targets"
+    bl_label = "Add Selected Armatures"
+    bl_description = "Add the selected armatures to the list of armatures to mark and export"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        settings = context.scene.cascadeur_export
+        try:
+            existing = set(target.armature for target in settings.armature_targets if target.armature)
+            added = 0
+            for obj in context.selected_objects:
+                if obj.type != 'ARMATURE' or obj in existing:
+                    continue
+                target = settings.armature_targets.add()
+                target.name = obj.name
+                target.armature = obj
+                existing.add(obj)
+                added += 1
+            
+            if not added:
+                self.report({'WARNING'}, "No new armature selected")
+                return {'CANCELLED'}
+            
+            # Armature đầu tiên trở thành armature đang chỉnh sửa
+            if utils.get_active_armature_target(context.scene) is None:
+                utils.activate_armature_target(context.scene, settings.armature_target_index)
+            
+            # Ghi store ngay để thay đổi nằm trong bước undo của operator này
+            utils.flush_marked_store(context.scene)
+            self.report({'INFO'}, f"Added {added} armatures")
+        except Exception as e:
+            self.report({'ERROR'}, f"Error adding armatures: {e}")
+            return {'CANCELLED'}
+        
+        return {'FINISHED'}
+
+# Operator để xóa armature khỏi danh sách nhiều armature
+class CASCADEUR_OT_remove_armature_target(Operator):
+    bl_idname = "cascadeur.remove_armature_target"
+    bl_label = "Remove Armature"
+    bl_description = "Remove the armature from the list (its marked keyframes are discarded)"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        scene = context.scene
+        settings = scene.cascadeur_export
+        index = settings.armature_target_index
+        if not 0 <= index < len(settings.armature_targets):
+            return {'CANCELLED'}
+        
+        try:
+            # Đánh dấu của armature bị xóa không còn dùng nữa
+            # (xóa trước khi đổi index, vì đổi index sẽ kích hoạt armature khác)
+            if settings.armature_targets[index].is_active:
+                store = utils.get_marked_store(scene)
+                if store.clear():
+                    utils.schedule_marked_store_flush(scene)
+                    utils.refresh_marked_keyframes(scene)
+                settings.armature = None
+            
+            settings.armature_targets.remove(index)
+            settings.armature_target_index = max(0, min(index, len(settings.armature_targets) - 1))
+            if len(settings.armature_targets):
+                utils.activate_armature_target(scene, settings.armature_target_index)
+            # Ghi store ngay để thay đổi nằm trong bước undo của operator này
+            utils.flush_marked_store(scene)
+        except Exception as e:
+            self.report({'ERROR'}, f"Error removing armature: {e}")
+            return {'CANCELLED'}
+        
+        return {'FINISHED'}
+
+# Operator để xuất metadata (và FBX) của tất cả armature trong danh sách
+class CASCADEUR_OT_export_all_targets(Operator):
+    bl_idname = "cascadeur.export_all_targets"
+    bl_label = "Export All Armatures"
+    bl_description = "Export keyframe metadata (and FBX) of every enabled armature"
+    
+    directory: StringProperty(
+        name="Output Directory",
+        description="Directory to write the files to",
+        default="//",
+        subtype='DIR_PATH'
+    )
+    
+    export_fbx: BoolProperty(
+        name="Export FBX",
+        description="Also export an FBX of each armature",
+        default=True
+    )
+    
+    def invoke(self, context, event):
+        targets = [t for t in context.scene.cascadeur_export.armature_targets if t.enabled and t.armature]
+        if not targets:
+            self.report({'WARNING'}, "No armatures to export. Add armatures to the list first.")
+            return {'CANCELLED'}
+        
+        # Mặc định xuất vào thư mục của file blend
+        if bpy.data.filepath:
+            self.directory = os.path.dirname(bpy.data.filepath)
+        
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def execute(self, context):
+        scene = context.scene
+        targets = [t for t in scene.cascadeur_export.armature_targets if t.enabled and t.armature]
+        directory = bpy.path.abspath(self.directory)
+        if bpy.data.filepath:
+            blend_name = os.path.splitext(os.path.basename(bpy.data.filepath))[0]
+        else:
+            blend_name = "untitled"
+        
+        try:
+            current_frame = scene.frame_current
+            exported = 0
+            for target in targets:
+                start = time.perf_counter()
+                armature = target.armature
+                store = utils.get_target_store(scene, target)
+                if not len(store):
+                    print(f"Skipping {armature.name}: no marked keyframes")
+                    continue
+                
+                # Xuất lần lượt từng nhân vật vào file riêng
+                base = os.path.join(directory, f"{blend_name}_{utils.safe_file_name(armature.name)}")
+                utils.write_keyframe_metadata(f"{base}_keyframes.json", store.to_dict())
+                if self.export_fbx:
+                    utils.export_armature_fbx(scene, armature, f"{base}.fbx")
+                
+                elapsed = time.perf_counter() - start
+                target.last_cost_ms = elapsed * 1000.0
+                profiling.record(f"export_all_targets:{armature.name}", elapsed, len(store))
+                print(f"Exported {armature.name}: {len(store)} keyframes in {elapsed * 1000.0:.1f} ms")
+                exported += 1
+            
+            # Khôi phục frame hiện tại
+            scene.frame_current = current_frame
+            self.report({'INFO'}, f"Exported {exported} armatures to {directory}")
+        except Exception as e:
+            self.report({'ERROR'}, f"Error exporting armatures: {e}")
+            return {'CANCELLED'}
+        
+        return {'FINISHED'}
+
 # Đăng ký
 classes = (
     CASCADEUR_OT_select_armature,
     CASCADEUR_OT_clear_armature,
     CASCADEUR_OT_open_arp_export,
     CASCADEUR_OT_export_unified,
+    CASCADEUR_OT_export_pose_snapshot,
+    CASCADEUR_OT_add_armature_targets,
+    CASCADEUR_OT_remove_armature_target,
+    CASCADEUR_OT_export_all_targets,
 )
 
 def register():
     for cls in classes:
+        # Đo thời gian các operator khi profiling được bật
+        if cls.__name__.startswith("CASCADEUR_OT_"):
+            profiling.instrument_class(cls)
         bpy.utils.register_class(cls)
 
 def unregister():
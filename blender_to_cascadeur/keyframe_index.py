@@ -0,0 +1,568 @@
+import bpy
+import math
+import re
+from bisect import bisect_left
+from . import profiling
+
+# NumPy ships with Blender, but keep a pure-Python fallback just in case
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Matches the bone name in data paths like pose.bones["Bone"].location
+_BONE_PATH_RE = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]')
+
+# Cached keyframe data for a single action
+class ActionKeyframeEntry:
+    def __init__(self, frames, bone_fcurves, bone_frames, signature):
+        # Sorted unique integer frames over all fcurves
+        self.frames = frames
+        # Bone name -> indices into action.fcurves, parsed once from the data paths
+        self.bone_fcurves = bone_fcurves
+        # Bone name -> sorted unique frames keyed on that bone
+        self.bone_frames = bone_frames
+        self.keyed_bones = set(bone_frames)
+        # Cheap shape check used to catch edits we were not told about
+        self.signature = signature
+
+# One entry per action, keyed by action identity
+_index = {}
+
+# Helper function to get a stable key for an action (original, not evaluated copy)
+def action_key(action):
+    original = getattr(action, "original", None) or action
+    return original.as_pointer()
+
+# Helper function to extract the bone name from an fcurve data path
+def parse_bone_name(data_path):
+    match = _BONE_PATH_RE.match(data_path)
+    if not match:
+        return None
+    return match.group(1).replace('\\"', '"').replace('\\\\', '\\')
+
+# Helper function to compute the shape signature of an action
+def _action_signature(fcurves, counts):
+    return (len(fcurves), sum(counts))
+
+# Helper function to scan an action once and build its index entry
+def _build_entry(action, fcurves, counts):
+    # Group fcurves by the bone they animate
+    bone_fcurves = {}
+    for i, fcurve in enumerate(fcurves):
+        bone_name = parse_bone_name(fcurve.data_path)
+        if bone_name is not None:
+            bone_fcurves.setdefault(bone_name, []).append(i)
+
+    total = sum(counts)
+    signature = _action_signature(fcurves, counts)
+    if total == 0:
+        return ActionKeyframeEntry([], bone_fcurves, {}, signature)
+
+    # Fast path: one foreach_get per fcurve into a preallocated NumPy buffer
+    if np is not None:
+        # "co" is stored as (frame, value) pairs
+        co = np.empty(total * 2, dtype=np.float32)
+        offsets = [0] * (len(fcurves) + 1)
+        offset = 0
+        for i, (fcurve, count) in enumerate(zip(fcurves, counts)):
+            if count:
+                fcurve.keyframe_points.foreach_get("co", co[offset * 2:(offset + count) * 2])
+            offset += count
+            offsets[i + 1] = offset
+
+        # Truncate like int() does
+        all_frames = co[0::2].astype(np.int64)
+        frames = np.unique(all_frames).tolist()
+
+        bone_frames = {}
+        for bone_name, indices in bone_fcurves.items():
+            chunks = [all_frames[offsets[i]:offsets[i + 1]] for i in indices if counts[i]]
+            if chunks:
+                bone_frames[bone_name] = np.unique(np.concatenate(chunks)).tolist()
+        return ActionKeyframeEntry(frames, bone_fcurves, bone_frames, signature)
+
+    # Fallback: plain Python loop over every keyframe
+    per_fcurve = [set(int(keyframe.co[0]) for keyframe in fcurve.keyframe_points) for fcurve in fcurves]
+    frames = sorted(set().union(*per_fcurve))
+    bone_frames = {}
+    for bone_name, indices in bone_fcurves.items():
+        bone_set = set().union(*(per_fcurve[i] for i in indices))
+        if bone_set:
+            bone_frames[bone_name] = sorted(bone_set)
+    return ActionKeyframeEntry(frames, bone_fcurves, bone_frames, signature)
+
+# Get the cached entry for an action, scanning it only if needed
+def get_entry(action):
+    fcurves = action.fcurves
+    counts = [len(fcurve.keyframe_points) for fcurve in fcurves]
+    key = action_key(action)
+
+    entry = _index.get(key)
+    if entry is not None and entry.signature == _action_signature(fcurves, counts):
+        return entry
+
+    entry = _build_entry(action, fcurves, counts)
+    _index[key] = entry
+    return entry
+
+# Get the sorted unique frames of an action
+def get_frames(action):
+    return get_entry(action).frames
+
+# Check if an action has a key at a frame - binary search over the cached frames
+def has_frame(action, frame):
+    frames = get_entry(action).frames
+    i = bisect_left(frames, frame)
+    return i < len(frames) and frames[i] == frame
+
+# Check if any of the given objects has a key at a frame
+# Stops at the first hit, and actions shared by several objects are only checked once.
+# With a tolerance, keys are matched by their rounded subframe times.
+def objects_have_frame(objects, frame, checked=None, tolerance=None):
+    if checked is None:
+        checked = set()
+    # Objects skipped because their action was already checked, for the profiling report
+    saved = 0
+    try:
+        for obj in objects:
+            anim_data = obj.animation_data
+            if not anim_data:
+                continue
+            # Objects with NLA strips are checked in scene time (they do not share results)
+            if uses_nla(anim_data):
+                if tolerance is not None:
+                    if frame in get_animation_frame_times(obj, tolerance):
+                        return True
+                else:
+                    frames = get_animation_frames(obj)
+                    i = bisect_left(frames, frame)
+                    if i < len(frames) and frames[i] == frame:
+                        return True
+                continue
+            if not anim_data.action:
+                continue
+            key = action_key(anim_data.action)
+            if key in checked:
+                saved += 1
+                continue
+            checked.add(key)
+            if tolerance is not None:
+                if frame in get_frame_times(anim_data.action, tolerance):
+                    return True
+            elif has_frame(anim_data.action, frame):
+                return True
+        return False
+    finally:
+        record_saved_scans(saved)
+
+# Get the union of keyed frames for a set of bones
+def get_bone_frames(action, bone_names):
+    entry = get_entry(action)
+    frames = set()
+    for bone_name in entry.keyed_bones.intersection(bone_names):
+        frames.update(entry.bone_frames[bone_name])
+    return frames
+
+# Raw key times of an action, only read when subframe precision is on
+class ActionKeyTimes:
+    def __init__(self, times, offsets, signature):
+        # Key times of all fcurves, concatenated (NumPy array, or list without NumPy)
+        self.times = times
+        # fcurve i owns times[offsets[i]:offsets[i + 1]]
+        self.offsets = offsets
+        self.signature = signature
+        # tolerance -> {frame: exact time}
+        self.frame_times = {}
+
+# One entry per action, keyed by action identity (separate from the integer index)
+_times_index = {}
+
+# Helper function to read every key time of an action in bulk
+def _read_key_times(fcurves, counts):
+    offsets = [0] * (len(fcurves) + 1)
+    for i, count in enumerate(counts):
+        offsets[i + 1] = offsets[i] + count
+
+    if np is not None:
+        co = np.empty(offsets[-1] * 2, dtype=np.float32)
+        for i, (fcurve, count) in enumerate(zip(fcurves, counts)):
+            if count:
+                fcurve.keyframe_points.foreach_get("co", co[offsets[i] * 2:offsets[i + 1] * 2])
+        return co[0::2].astype(np.float64), offsets
+
+    times = [keyframe.co[0] for fcurve in fcurves for keyframe in fcurve.keyframe_points]
+    return times, offsets
+
+# Get the cached key times of an action, reading them only if needed
+def get_key_times(action):
+    fcurves = action.fcurves
+    counts = [len(fcurve.keyframe_points) for fcurve in fcurves]
+    signature = _action_signature(fcurves, counts)
+    key = action_key(action)
+
+    entry = _times_index.get(key)
+    if entry is not None and entry.signature == signature:
+        return entry
+
+    times, offsets = _read_key_times(fcurves, counts)
+    entry = ActionKeyTimes(times, offsets, signature)
+    _times_index[key] = entry
+    return entry
+
+# Group key times whose gaps are within the tolerance, returns the mean time of each group
+def cluster_times(times, tolerance):
+    if np is not None:
+        ordered = np.sort(np.asarray(times, dtype=np.float64))
+        if not len(ordered):
+            return []
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(ordered) > tolerance) + 1))
+        sizes = np.diff(np.append(starts, len(ordered)))
+        return (np.add.reduceat(ordered, starts) / sizes).tolist()
+
+    clusters = []
+    group = []
+    for time in sorted(times):
+        if group and time - group[-1] > tolerance:
+            clusters.append(sum(group) / len(group))
+            group = []
+        group.append(time)
+    if group:
+        clusters.append(sum(group) / len(group))
+    return clusters
+
+# Helper function to map clustered times to the nearest whole frame
+# When several groups round to the same frame, the one closest to it wins.
+# Times are rounded to 6 decimals to drop float32 noise (keys are stored as float32).
+def _nearest_frames(clustered):
+    frame_times = {}
+    for time in clustered:
+        time = round(time, 6)
+        frame = int(math.floor(time + 0.5))
+        current = frame_times.get(frame)
+        if current is None or abs(time - frame) < abs(current - frame):
+            frame_times[frame] = time
+    return frame_times
+
+# Get {frame: exact time} of an action, frames rounded instead of truncated
+def get_frame_times(action, tolerance):
+    entry = get_key_times(action)
+    frame_times = entry.frame_times.get(tolerance)
+    if frame_times is None:
+        frame_times = entry.frame_times[tolerance] = _nearest_frames(cluster_times(entry.times, tolerance))
+    return frame_times
+
+# Get {frame: exact time} for a set of bones
+def get_bone_frame_times(action, bone_names, tolerance):
+    bone_fcurves = get_entry(action).bone_fcurves
+    entry = get_key_times(action)
+    indices = sorted(i for name in bone_names for i in bone_fcurves.get(name, ()))
+    chunks = [entry.times[entry.offsets[i]:entry.offsets[i + 1]] for i in indices]
+    if np is not None:
+        times = np.concatenate(chunks) if chunks else np.empty(0)
+    else:
+        times = [time for chunk in chunks for time in chunk]
+    return _nearest_frames(cluster_times(times, tolerance))
+
+# Helper function to check if animation data has NLA strips that get evaluated
+def uses_nla(anim_data):
+    if not anim_data or not getattr(anim_data, "use_nla", True):
+        return False
+    return any(track.strips for track in anim_data.nla_tracks if not track.mute)
+
+# Helper function to check if animation data has anything to collect keys from
+def has_animation(anim_data):
+    return bool(anim_data) and (anim_data.action is not None or uses_nla(anim_data))
+
+# Helper function to list the playing action strips of animation data (meta strips flattened)
+def _iter_action_strips(strips):
+    for strip in strips:
+        if strip.mute:
+            continue
+        if strip.type == 'META':
+            yield from _iter_action_strips(strip.strips)
+        elif strip.action is not None:
+            yield strip
+
+def _active_strips(anim_data):
+    strips = []
+    for track in anim_data.nla_tracks:
+        if not track.mute:
+            strips.extend(_iter_action_strips(track.strips))
+    return strips
+
+# Map action times to scene times through a strip's offset, scale, repeat and reversal
+# Times outside the strip's action range are not played and are dropped.
+def map_strip_times(times, strip):
+    action_start = strip.action_frame_start
+    action_end = strip.action_frame_end
+    length = max(action_end - action_start, 1e-6)
+    scale = abs(strip.scale) or 1.0
+    repeats = max(1, int(math.ceil(strip.repeat - 1e-6)))
+    # Small slack so keys sitting exactly on the strip bounds survive float error
+    epsilon = 1e-4
+
+    if np is not None:
+        times = np.asarray(times, dtype=np.float64)
+        times = times[(times >= action_start - epsilon) & (times <= action_end + epsilon)]
+        local = (action_end - times) if strip.use_reverse else (times - action_start)
+        cycles = np.arange(repeats, dtype=np.float64)[:, None] * length
+        mapped = (strip.frame_start + (local[None, :] + cycles) * scale).ravel()
+        return mapped[mapped <= strip.frame_end + epsilon]
+
+    mapped = []
+    for time in times:
+        if time < action_start - epsilon or time > action_end + epsilon:
+            continue
+        local = (action_end - time) if strip.use_reverse else (time - action_start)
+        for cycle in range(repeats):
+            scene_time = strip.frame_start + (local + cycle * length) * scale
+            if scene_time <= strip.frame_end + epsilon:
+                mapped.append(scene_time)
+    return mapped
+
+# Helper function to round mapped scene times to sorted unique whole frames
+def _unique_frames(chunks):
+    if np is not None:
+        chunks = [np.asarray(chunk, dtype=np.float64) for chunk in chunks]
+        if not chunks:
+            return []
+        return np.unique(np.floor(np.concatenate(chunks) + 0.5).astype(np.int64)).tolist()
+    return sorted(set(int(math.floor(time + 0.5)) for chunk in chunks for time in chunk))
+
+# NLA results per owner of the animation data: key -> (signature, frames, action keys)
+_nla_frames = {}
+
+# Helper function to describe what the NLA evaluation of animation data depends on
+# Returns (entries, strip settings). Entries come from the per-action cache, so an
+# edited action gives a new entry object; they are kept in the signature (not their
+# id(), which a new entry can reuse once the old one is freed) and compared with `is`.
+def _nla_signature(anim_data, strips, include_action):
+    entries = [get_entry(anim_data.action) if include_action else None]
+    settings = []
+    for strip in strips:
+        entries.append(get_entry(strip.action))
+        settings.append((strip.frame_start, strip.frame_end,
+                         strip.action_frame_start, strip.action_frame_end,
+                         strip.scale, strip.repeat, strip.use_reverse))
+    return entries, tuple(settings)
+
+# Helper function to compare two NLA signatures
+def _same_nla_signature(a, b):
+    return (a[1] == b[1] and len(a[0]) == len(b[0])
+            and all(x is y for x, y in zip(a[0], b[0])))
+
+# Get the sorted unique scene frames of animation data, with NLA strips mapped to scene time
+# Each action is scanned once through the per-action cache; strips only remap its frames.
+def get_animation_frames(owner, bone_names=None):
+    anim_data = owner.animation_data
+    if not anim_data:
+        return []
+    # In tweak mode the edited action is also a strip, map it through that strip
+    include_action = anim_data.action is not None and not getattr(anim_data, "use_tweak_mode", False)
+    if not uses_nla(anim_data):
+        if not include_action:
+            return []
+        if bone_names is None:
+            return get_frames(anim_data.action)
+        return sorted(get_bone_frames(anim_data.action, bone_names))
+
+    strips = _active_strips(anim_data)
+    signature = None
+    if bone_names is None:
+        key = action_key(owner)
+        signature = _nla_signature(anim_data, strips, include_action)
+        cached = _nla_frames.get(key)
+        if cached is not None and _same_nla_signature(cached[0], signature):
+            return cached[1]
+
+    def action_frames(action):
+        if bone_names is None:
+            return get_frames(action)
+        return sorted(get_bone_frames(action, bone_names))
+
+    chunks = [map_strip_times(action_frames(strip.action), strip) for strip in strips]
+    if include_action:
+        chunks.append(action_frames(anim_data.action))
+    frames = _unique_frames(chunks)
+
+    if signature is not None:
+        action_keys = {action_key(strip.action) for strip in strips}
+        if include_action:
+            action_keys.add(action_key(anim_data.action))
+        _nla_frames[key] = (signature, frames, action_keys)
+    return frames
+
+# Get {frame: exact time} of animation data with NLA strips mapped (subframe precision mode)
+def get_animation_frame_times(owner, tolerance, bone_names=None):
+    anim_data = owner.animation_data
+    if not anim_data:
+        return {}
+    include_action = anim_data.action is not None and not getattr(anim_data, "use_tweak_mode", False)
+
+    def action_times(action):
+        if bone_names is None:
+            return get_frame_times(action, tolerance)
+        return get_bone_frame_times(action, bone_names, tolerance)
+
+    if not uses_nla(anim_data):
+        return action_times(anim_data.action) if include_action else {}
+
+    chunks = [map_strip_times(sorted(action_times(strip.action).values()), strip)
+              for strip in _active_strips(anim_data)]
+    if include_action:
+        chunks.append(sorted(action_times(anim_data.action).values()))
+    if np is not None:
+        times = np.concatenate([np.asarray(chunk, dtype=np.float64) for chunk in chunks]) if chunks else np.empty(0)
+    else:
+        times = [time for chunk in chunks for time in chunk]
+    return _nearest_frames(cluster_times(times, tolerance))
+
+# Name of the profiling entry that counts the scans saved by ActionCollector
+SHARED_SCANS_STAT = "keyframe_index.shared_action_scans_saved"
+
+# Collects keyed frames for many objects, scanning each shared action once
+# Objects that play the same action without NLA strips (linked duplicates, library
+# overrides...) are grouped by action identity; the first object of a group scans the
+# action and the others get the same result back. Objects with NLA strips are mapped
+# through their own strips and are scanned on their own.
+class ActionCollector:
+    def __init__(self, tolerance=None):
+        # With a tolerance results are {frame: time} (subframe precision), else sorted frames
+        self.tolerance = tolerance
+        # Group key -> result
+        self.results = {}
+        self.scanned = 0
+        self.reused = 0
+
+    # Helper function to get the group of an object, None if it has no animation
+    @staticmethod
+    def group_key(obj, bone_names=None):
+        anim_data = obj.animation_data
+        if not has_animation(anim_data):
+            return None
+        if uses_nla(anim_data) or anim_data.action is None:
+            key = ("NLA", action_key(obj))
+        else:
+            key = action_key(anim_data.action)
+        return key if bone_names is None else (key, frozenset(bone_names))
+
+    # Get the frames (or frame times) of an object, scanning its action only for the first object
+    def collect(self, obj, bone_names=None):
+        key = self.group_key(obj, bone_names)
+        if key is None:
+            return {} if self.tolerance is not None else []
+        result = self.results.get(key)
+        if result is not None:
+            self.reused += 1
+            return result
+        if self.tolerance is not None:
+            result = get_animation_frame_times(obj, self.tolerance, bone_names)
+        else:
+            result = get_animation_frames(obj, bone_names)
+        self.results[key] = result
+        self.scanned += 1
+        return result
+
+    # Record in the profiling report how many scans the grouping saved
+    def report(self):
+        record_saved_scans(self.reused)
+
+# Helper function to add saved scans to the profiling report
+def record_saved_scans(count):
+    if count and profiling.is_enabled():
+        profiling.record(SHARED_SCANS_STAT, 0.0, count)
+
+# Visible bone sets per armature data: key -> (visibility signature, set of bone names)
+_visible_bones = {}
+
+# Helper function to describe the visibility state of an armature cheaply
+def _visibility_signature(armature_data):
+    if hasattr(armature_data, 'collections'):
+        return tuple((c.name, c.is_visible, len(c.bones)) for c in armature_data.collections)
+    return (tuple(armature_data.layers), len(armature_data.bones))
+
+# Get the names of bones in visible bone collections (or layers on older Blender)
+def get_visible_bones(armature):
+    armature_data = armature.data
+    key = action_key(armature_data)
+    signature = _visibility_signature(armature_data)
+
+    cached = _visible_bones.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    visible = set()
+    if hasattr(armature_data, 'collections'):  # Newer Blender with bone collections
+        for collection in armature_data.collections:
+            if collection.is_visible:
+                visible.update(bone.name for bone in collection.bones)
+    else:  # Older Blender with bone layers
+        bones = armature_data.bones
+        visible_layers = list(armature_data.layers)
+        if np is not None and len(bones):
+            # Read all 32 layer flags of every bone in one call
+            layers = np.zeros(len(bones) * 32, dtype=bool)
+            bones.foreach_get("layers", layers)
+            mask = layers.reshape(-1, 32)[:, np.array(visible_layers, dtype=bool)].any(axis=1)
+            visible.update(bone.name for bone, shown in zip(bones, mask) if shown)
+        else:
+            visible_indices = [i for i, shown in enumerate(visible_layers) if shown]
+            for bone in bones:
+                if any(bone.layers[i] for i in visible_indices):
+                    visible.add(bone.name)
+
+    _visible_bones[key] = (signature, visible)
+    return visible
+
+# Drop the cached entry for one action, and the NLA results that use it
+def invalidate(action):
+    key = action_key(action)
+    _index.pop(key, None)
+    _times_index.pop(key, None)
+    for owner in [owner for owner, cached in _nla_frames.items() if key in cached[2]]:
+        del _nla_frames[owner]
+
+# Drop every cached entry
+def clear():
+    _index.clear()
+    _times_index.clear()
+    _nla_frames.clear()
+    _visible_bones.clear()
+
+# Depsgraph handler - only invalidates actions that were actually updated
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def on_depsgraph_update(scene, depsgraph):
+    if not _index and not _times_index and not _nla_frames and not _visible_bones:
+        return
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Action):
+            invalidate(update.id)
+        elif isinstance(update.id, bpy.types.Armature):
+            _visible_bones.pop(action_key(update.id), None)
+        elif isinstance(update.id, bpy.types.Object):
+            # NLA strips live on the object, drop its mapped frames
+            _nla_frames.pop(action_key(update.id), None)
+
+# Load/undo handler - pointers are not stable across these, start over
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def on_data_reloaded(*args):
+    clear()
+
+# Registration
+def register():
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if on_data_reloaded not in handlers:
+            handlers.append(on_data_reloaded)
+
+def unregister():
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if on_data_reloaded in handlers:
+            handlers.remove(on_data_reloaded)
+    clear()
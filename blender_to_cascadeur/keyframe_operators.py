@@ -1,7 +1,15 @@
 import bpy
+import math
+import time
+from bisect import bisect_left
 from bpy.types import Operator, UIList
-from bpy.props import IntProperty, BoolProperty, StringProperty, EnumProperty
+from bpy.props import IntProperty, BoolProperty, StringProperty, EnumProperty, FloatProperty
 from . import utils
+from . import profiling
+from . import refresh_scheduler
+from . import keyframe_index
+from . import pose_detection
+from . import keyframe_scan
 
 # UIList với checkbox và bộ lọc hoạt động tốt
 class CASCADEUR_UL_keyframe_list(UIList):
@@ -21,46 +29,82 @@ class CASCADEUR_UL_keyframe_list(UIList):
             layout.alignment = 'CENTER'
             layout.label(text=str(item.frame))
     
-    # Cải thiện hàm filter_items để xử lý tìm kiếm và lọc
+    # Cache kết quả lọc theo scene: (khóa, flags, order)
+    _filter_cache = {}
+    # Chỉ mục chuỗi đã sắp xếp theo scene: (version, chuỗi frame, chỉ mục item, is_marked)
+    _search_index = {}
+    
+    # Dựng chỉ mục tìm kiếm theo tiền tố cho một phiên bản danh sách
+    def _get_search_index(self, scene, items, version):
+        key = utils.scene_key(scene)
+        cached = self._search_index.get(key)
+        if cached is not None and cached[0] == version and len(cached[3]) == len(items):
+            return cached
+        
+        frames = utils.get_keyframe_item_frames(items)
+        marks = [False] * len(items)
+        items.foreach_get("is_marked", marks)
+        
+        # Sắp xếp chuỗi frame theo thứ tự từ điển để tìm tiền tố bằng bisect
+        pairs = sorted((str(frame), i) for i, frame in enumerate(frames))
+        cached = (version, [p[0] for p in pairs], [p[1] for p in pairs], marks)
+        self._search_index[key] = cached
+        return cached
+    
+    # Lọc theo chuỗi tìm kiếm và trạng thái đánh dấu, dùng cache giữa các lần vẽ lại
     def filter_items(self, context, data, propname):
         # Lấy tất cả các mục
         items = getattr(data, propname)
+        scene = context.scene
         
         # Lấy cài đặt bộ lọc từ property group
-        filter_name = context.scene.cascadeur_export.list_filter.filter_string.lower()
-        filter_state = context.scene.cascadeur_export.list_filter.filter_state
-        
-        # Tạo danh sách flags với giá trị mặc định là ẩn (0)
-        flags = [0] * len(items)
-        
-        # Lọc theo chuỗi tìm kiếm và trạng thái đánh dấu
-        for i, item in enumerate(items):
-            # Kiểm tra chuỗi tìm kiếm - nếu không có tìm kiếm hoặc frame khớp với tìm kiếm
-            search_ok = not filter_name or str(item.frame).startswith(filter_name)
-            
-            # Kiểm tra trạng thái đánh dấu - nếu ALL hoặc mục khớp với bộ lọc
-            state_ok = (filter_state == 'ALL') or \
-                      (filter_state == 'MARKED' and item.is_marked) or \
-                      (filter_state == 'UNMARKED' and not item.is_marked)
-            
-            # Nếu cả hai điều kiện đều được đáp ứng, hiển thị mục
-            if search_ok and state_ok:
-                flags[i] |= self.bitflag_filter_item
+        filter_name = scene.cascadeur_export.list_filter.filter_string.lower()
+        filter_state = scene.cascadeur_export.list_filter.filter_state
+        version = utils.get_keyframe_list_version(scene)
         
-        # Tạo danh sách để sắp xếp - chỉ bao gồm các mục hiển thị
-        ordering = []
-        for i, item in enumerate(items):
-            if flags[i] & self.bitflag_filter_item:
-                ordering.append((i, item.frame))
+        # Nếu không có gì thay đổi, trả lại kết quả trước đó
+        cache_key = (filter_name, filter_state, version, len(items))
+        cached = self._filter_cache.get(utils.scene_key(scene))
+        if cached is not None and cached[0] == cache_key:
+            return cached[1], cached[2]
+        profiling.add_items(len(items))
         
-        # Sắp xếp theo số frame
-        ordering.sort(key=lambda item: item[1])
+        # Không lọc gì - hiển thị tất cả
+        if not filter_name and filter_state == 'ALL':
+            flags = [self.bitflag_filter_item] * len(items)
+        else:
+            _, strings, indices, marks = self._get_search_index(scene, items, version)
+            
+            # Tìm khoảng các frame có cùng tiền tố bằng bisect
+            if filter_name:
+                start = bisect_left(strings, filter_name)
+                end = bisect_left(strings, filter_name + "\uffff", start)
+                candidates = indices[start:end]
+            else:
+                candidates = indices
+            
+            # Tạo danh sách flags với giá trị mặc định là ẩn (0)
+            flags = [0] * len(items)
+            for i in candidates:
+                # Kiểm tra trạng thái đánh dấu - nếu ALL hoặc mục khớp với bộ lọc
+                if filter_state == 'ALL' or marks[i] == (filter_state == 'MARKED'):
+                    flags[i] = self.bitflag_filter_item
         
-        # Chỉ trích xuất các chỉ mục
-        order = [x[0] for x in ordering]
+        # Danh sách đã được sắp xếp theo frame, không cần sắp xếp lại
+        order = []
         
+        self._filter_cache[utils.scene_key(scene)] = (cache_key, flags, order)
         return flags, order
 
+# Xóa cache lọc khi undo/redo/nạp file khôi phục is_marked của các mục
+# (phiên bản danh sách không đổi nên cache cũ sẽ trả về kết quả sai)
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def reset_list_caches(*args):
+    CASCADEUR_UL_keyframe_list._filter_cache.clear()
+    CASCADEUR_UL_keyframe_list._search_index.clear()
+    utils.reset_keyframe_list_versions()
+
 # Operator để chọn một keyframe trong danh sách
 class CASCADEUR_OT_select_keyframe(Operator):
     bl_idname = "cascadeur.select_keyframe"
@@ -91,11 +135,8 @@ class CASCADEUR_OT_toggle_keyframe_item(Operator):
         scene = context.scene
         
         try:
-            # Lấy số frame dưới dạng chuỗi
-            frame_str = str(self.frame)
-            
-            # Lấy keyframes đã đánh dấu hiện tại
-            marked_keyframes = utils.get_marked_keyframes(scene)
+            # Lấy store keyframes đã đánh dấu hiện tại
+            store = utils.get_marked_store(scene)
             
             # Lưu frame hiện tại để khôi phục sau
             current_frame = scene.frame_current
@@ -103,25 +144,24 @@ class CASCADEUR_OT_toggle_keyframe_item(Operator):
             # Cập nhật trạng thái của mục UI list
             for item in scene.cascadeur_export.keyframe_items:
                 if item.frame == self.frame:
-                    item.is_marked = self.toggle_state
+                    if item.is_marked != self.toggle_state:
+                        item.is_marked = self.toggle_state
+                        utils.bump_keyframe_list_version(scene)
                     break
             
             # Cập nhật dữ liệu keyframes đã đánh dấu thực tế
-            if self.toggle_state and frame_str not in marked_keyframes:
-                # Thêm keyframe vào danh sách đã đánh dấu
-                marked_keyframes[frame_str] = {}
-            elif not self.toggle_state and frame_str in marked_keyframes:
-                # Xóa keyframe khỏi danh sách đã đánh dấu
-                del marked_keyframes[frame_str]
-            
-            # Lưu dữ liệu đã cập nhật
-            if utils.set_marked_keyframes(scene, marked_keyframes):
-                # Khôi phục frame hiện tại để tránh nhảy không mong muốn
-                scene.frame_current = current_frame
-                return {'FINISHED'}
+            if self.toggle_state:
+                changed = store.add(self.frame, utils.get_mark_metadata(scene, self.frame))
             else:
-                self.report({'ERROR'}, "Failed to update keyframe")
-                return {'CANCELLED'}
+                changed = store.remove(self.frame)
+            
+            # Chỉ đồng bộ markers (gộp lại qua scheduler), không cần dựng lại danh sách
+            if changed:
+                refresh_scheduler.request(scene, refresh_scheduler.STORE,
+                                          refresh_scheduler.MARKERS, refresh_scheduler.STATS)
+            
+            # Khôi phục frame hiện tại để tránh nhảy không mong muốn
+            scene.frame_current = current_frame
                 
         except Exception as e:
             self.report({'ERROR'}, f"Error toggling keyframe: {e}")
@@ -153,18 +193,12 @@ class CASCADEUR_OT_mark_keyframe(Operator):
                     self.report({'WARNING'}, f"No keyframe at frame {current_frame}")
                     return {'CANCELLED'}
             
-            # Tải keyframes đã đánh dấu hiện có
-            marked_keyframes = utils.get_marked_keyframes(scene)
-            
-            # Thêm frame hiện tại (chuyển đổi thành chuỗi để tương thích JSON)
-            frame_key = str(current_frame)
-            marked_keyframes[frame_key] = {}
-            
-            # Lưu ngược vào thuộc tính
-            if utils.set_marked_keyframes(scene, marked_keyframes):
-                self.report({'INFO'}, f"Keyframe {current_frame} marked")
-            else:
-                self.report({'ERROR'}, "Failed to mark keyframe. Please try again.")
+            # Thêm frame hiện tại vào store
+            store = utils.get_marked_store(scene)
+            if store.add(current_frame, utils.get_mark_metadata(scene, current_frame)):
+                utils.schedule_marked_store_flush(scene)
+                utils.refresh_marked_keyframes(scene, preserve_ui_items=True)
+            self.report({'INFO'}, f"Keyframe {current_frame} marked")
                 
         except Exception as e:
             self.report({'ERROR'}, f"Error marking keyframe: {e}")
@@ -174,30 +208,24 @@ class CASCADEUR_OT_mark_keyframe(Operator):
     
     def has_keyframe_at_frame(self, context, frame, armature=None):
         try:
+            # Ở chế độ subframe, so khớp theo thời gian key đã làm tròn
+            tolerance = utils.get_subframe_tolerance(context.scene)
+            
             # Nếu chỉ định armature, chỉ kiểm tra armature đó
             if armature:
-                if armature.animation_data and armature.animation_data.action:
-                    for fcurve in armature.animation_data.action.fcurves:
-                        for keyframe in fcurve.keyframe_points:
-                            if int(keyframe.co[0]) == frame:
-                                return True
-                return False
+                return keyframe_index.objects_have_frame((armature,), frame, tolerance=tolerance)
+            
+            # Các action đã kiểm tra, để action dùng chung chỉ kiểm tra một lần
+            checked = set()
             
             # Nếu không, kiểm tra các đối tượng đã chọn trước
-            for obj in context.selected_objects:
-                if obj.animation_data and obj.animation_data.action:
-                    for fcurve in obj.animation_data.action.fcurves:
-                        for keyframe in fcurve.keyframe_points:
-                            if int(keyframe.co[0]) == frame:
-                                return True
+            if keyframe_index.objects_have_frame(context.selected_objects, frame, checked, tolerance):
+                return True
             
             # Nếu không có đối tượng đã chọn nào có keyframes, kiểm tra tất cả các đối tượng armature
-            for obj in context.scene.objects:
-                if obj.type == 'ARMATURE' and obj.animation_data and obj.animation_data.action:
-                    for fcurve in obj.animation_data.action.fcurves:
-                        for keyframe in fcurve.keyframe_points:
-                            if int(keyframe.co[0]) == frame:
-                                return True
+            armatures = (obj for obj in context.scene.objects if obj.type == 'ARMATURE')
+            if keyframe_index.objects_have_frame(armatures, frame, checked, tolerance):
+                return True
                                 
         except Exception as e:
             print(f"Error checking for keyframe: {e}")
@@ -216,17 +244,12 @@ class CASCADEUR_OT_unmark_keyframe(Operator):
         current_frame = scene.frame_current
         
         try:
-            # Tải keyframes đã đánh dấu hiện có
-            marked_keyframes = utils.get_marked_keyframes(scene)
-            
-            # Xóa frame hiện tại nếu tồn tại
-            frame_key = str(current_frame)
-            if frame_key in marked_keyframes:
-                del marked_keyframes[frame_key]
-                if utils.set_marked_keyframes(scene, marked_keyframes):
-                    self.report({'INFO'}, f"Keyframe {current_frame} unmarked")
-                else:
-                    self.report({'ERROR'}, "Failed to unmark keyframe. Please try again.")
+            # Xóa frame hiện tại khỏi store nếu tồn tại
+            store = utils.get_marked_store(scene)
+            if store.remove(current_frame):
+                utils.schedule_marked_store_flush(scene)
+                utils.refresh_marked_keyframes(scene, preserve_ui_items=True)
+                self.report({'INFO'}, f"Keyframe {current_frame} unmarked")
             else:
                 self.report({'INFO'}, f"Keyframe {current_frame} was not marked")
                 
@@ -275,42 +298,28 @@ class CASCADEUR_OT_mark_all_keyframes(Operator):
             if context.mode == 'POSE' and context.selected_pose_bones:
                 for bone in context.selected_pose_bones:
                     selected_bones.add(bone.name)
-            # Nếu không, kiểm tra các collection xương hiển thị hoặc các layer
-            elif hasattr(armature.data, 'collections'):  # Blender mới hơn với bone collections
-                for collection in armature.data.collections:
-                    if collection.is_visible:
-                        for bone in collection.bones:
-                            selected_bones.add(bone.name)
-            else:  # Blender cũ hơn với bone layers
-                visible_layers = armature.data.layers
-                for bone in armature.data.bones:
-                    if any(bone.layers[i] and visible_layers[i] for i in range(32)):
-                        selected_bones.add(bone.name)
+            # Nếu không, dùng tập xương hiển thị đã cache (bone collections hoặc layers)
+            else:
+                selected_bones = keyframe_index.get_visible_bones(armature)
             
             # Nếu không có xương nào được chọn, thông báo cho người dùng
             if not selected_bones:
                 self.report({'WARNING'}, "No bones selected or visible. Please select some bones first.")
                 return {'CANCELLED'}
             
-            # Tìm tất cả keyframes cho xương đã chọn
+            # Tìm tất cả keyframes cho xương đã chọn - hợp các tập frame theo xương từ index
             all_keyframes = set()
-            
-            if armature.animation_data and armature.animation_data.action:
-                for fcurve in armature.animation_data.action.fcurves:
-                    # Kiểm tra xem fcurve này có dành cho xương đã chọn không
-                    if "pose.bones" in fcurve.data_path:
-                        try:
-                            # Trích xuất tên xương từ data_path (xử lý các định dạng khác nhau)
-                            if '["' in fcurve.data_path and '"]' in fcurve.data_path:
-                                bone_name = fcurve.data_path.split('["')[1].split('"]')[0]
-                                
-                                if bone_name in selected_bones:
-                                    # Thêm tất cả keyframes từ xương đã chọn này
-                                    for keyframe in fcurve.keyframe_points:
-                                        all_keyframes.add(int(keyframe.co[0]))
-                        except:
-                            # Nếu chúng ta không thể phân tích tên xương, bỏ qua
-                            continue
+            frame_metadata = None
+            tolerance = utils.get_subframe_tolerance(scene)
+            # Strip NLA được ánh xạ sang thời gian scene
+            if keyframe_index.has_animation(armature.animation_data):
+                if tolerance is not None:
+                    # Chế độ subframe: làm tròn và lưu thời gian chính xác vào metadata
+                    frame_times = keyframe_index.get_animation_frame_times(armature, tolerance, selected_bones)
+                    all_keyframes = set(frame_times)
+                    frame_metadata = {frame: {"time": time} for frame, time in frame_times.items()}
+                else:
+                    all_keyframes = keyframe_index.get_animation_frames(armature, selected_bones)
             
             all_keyframes = sorted(list(all_keyframes))
             
@@ -318,19 +327,12 @@ class CASCADEUR_OT_mark_all_keyframes(Operator):
                 self.report({'WARNING'}, "No keyframes found for selected bones.")
                 return {'CANCELLED'}
             
-            # Tạo dictionary mới cho keyframes đã đánh dấu
-            marked_keyframes = {}
-            
-            # Thêm tất cả keyframes 
-            for frame in all_keyframes:
-                frame_key = str(frame)
-                marked_keyframes[frame_key] = {}
-            
-            # Lưu ngược vào thuộc tính
-            if utils.set_marked_keyframes(scene, marked_keyframes):
-                self.report({'INFO'}, f"Marked {len(all_keyframes)} keyframes from selected bones")
-            else:
-                self.report({'ERROR'}, "Failed to mark keyframes. Please try again.")
+            # Thay thế toàn bộ keyframes đã đánh dấu bằng một lần cập nhật
+            store = utils.get_marked_store(scene)
+            store.bulk_update(replace=all_keyframes, metadata=frame_metadata)
+            utils.schedule_marked_store_flush(scene)
+            utils.refresh_marked_keyframes(scene)
+            self.report({'INFO'}, f"Marked {len(all_keyframes)} keyframes from selected bones")
             
             # Khôi phục chế độ trước đó nếu cần
             if current_mode != 'POSE':
@@ -348,6 +350,188 @@ class CASCADEUR_OT_mark_all_keyframes(Operator):
         
         return {'FINISHED'}
 
+# Operator để đánh dấu tất cả keyframes cho mọi armature trong chế độ nhiều armature
+class CASCADEUR_OT_mark_all_targets(Operator):
+    bl_idname = "cascadeur.mark_all_targets"
+    bl_label = "Mark All (All Armatures)"
+    bl_description = "Mark all keyframes of the visible bones on every enabled armature"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        scene = context.scene
+        targets = [t for t in scene.cascadeur_export.armature_targets if t.enabled and t.armature]
+        if not targets:
+            self.report({'WARNING'}, "No armatures to mark. Add armatures to the list first.")
+            return {'CANCELLED'}
+        
+        try:
+            tolerance = utils.get_subframe_tolerance(scene)
+            # Các nhân vật dùng chung action (và cùng tập xương) chỉ quét một lần
+            collector = keyframe_index.ActionCollector(tolerance)
+            total = 0
+            
+            for target in targets:
+                start = time.perf_counter()
+                armature = target.armature
+                frames = []
+                frame_metadata = None
+                
+                if keyframe_index.has_animation(armature.animation_data):
+                    bones = keyframe_index.get_visible_bones(armature)
+                    result = collector.collect(armature, bones)
+                    
+                    if tolerance is not None:
+                        frames = sorted(result)
+                        frame_metadata = {frame: {"time": time_} for frame, time_ in result.items()}
+                    else:
+                        frames = result
+                
+                # Thay thế keyframes đã đánh dấu của armature bằng một lần cập nhật
+                store = utils.get_target_store(scene, target)
+                if store.bulk_update(replace=frames, metadata=frame_metadata):
+                    utils.save_target_store(scene, target, store)
+                
+                # Ghi lại chi phí cho từng nhân vật
+                elapsed = time.perf_counter() - start
+                target.last_frames = len(frames)
+                target.last_cost_ms = elapsed * 1000.0
+                profiling.record(f"mark_all_targets:{armature.name}", elapsed, len(frames))
+                total += len(frames)
+            
+            collector.report()
+            # Ghi store ngay để thay đổi nằm trong bước undo của operator này
+            utils.flush_marked_store(scene)
+            self.report({'INFO'}, f"Marked {total} keyframes on {len(targets)} armatures "
+                                  f"({collector.reused} shared scans reused)")
+        except Exception as e:
+            self.report({'ERROR'}, f"Error marking keyframes: {e}")
+            return {'CANCELLED'}
+        
+        return {'FINISHED'}
+
+# Operator để xóa đánh dấu của mọi armature trong chế độ nhiều armature
+class CASCADEUR_OT_clear_all_targets(Operator):
+    bl_idname = "cascadeur.clear_all_targets"
+    bl_label = "Clear All (All Armatures)"
+    bl_description = "Remove the keyframe marks of every enabled armature"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        scene = context.scene
+        try:
+            for target in scene.cascadeur_export.armature_targets:
+                if not target.enabled:
+                    continue
+                store = utils.get_target_store(scene, target)
+                if store.clear():
+                    utils.save_target_store(scene, target, store)
+                target.last_frames = 0
+            # Ghi store ngay để thay đổi nằm trong bước undo của operator này
+            utils.flush_marked_store(scene)
+            self.report({'INFO'}, "Cleared the marks of all armatures")
+        except Exception as e:
+            self.report({'ERROR'}, f"Error clearing keyframes: {e}")
+            return {'CANCELLED'}
+        
+        return {'FINISHED'}
+
+# Operator để tự động đề xuất các key pose từ chuyển động của xương
+class CASCADEUR_OT_detect_key_poses(Operator):
+    bl_idname = "cascadeur.detect_key_poses"
+    bl_label = "Detect Key Poses"
+    bl_description = "Mark frames where the bones slow down or change direction"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    min_depth: FloatProperty(
+        name="Minimum Dip",
+        description="How far the motion must slow down (relative to its peak speed) to count as a pose",
+        default=0.1,
+        min=0.0,
+        max=1.0
+    )
+    turn_angle: FloatProperty(
+        name="Turn Angle",
+        description="Change of direction a bone needs to count as turning",
+        default=math.radians(60.0),
+        min=0.0,
+        max=math.pi,
+        subtype='ANGLE'
+    )
+    min_turning: FloatProperty(
+        name="Turning Bones",
+        description="Fraction of the moving bones that must turn at the same frame",
+        default=0.25,
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR'
+    )
+    spacing: IntProperty(
+        name="Minimum Spacing",
+        description="Minimum number of frames between proposed poses",
+        default=3,
+        min=1
+    )
+    replace: BoolProperty(
+        name="Replace Marks",
+        description="Replace the marked keyframes instead of adding to them",
+        default=False
+    )
+    
+    def execute(self, context):
+        scene = context.scene
+        
+        if not pose_detection.is_available():
+            self.report({'ERROR'}, "Key pose detection requires NumPy")
+            return {'CANCELLED'}
+        
+        armature = scene.cascadeur_export.armature
+        if not armature:
+            self.report({'WARNING'}, "No armature selected. Please select an armature first.")
+            return {'CANCELLED'}
+        if not armature.animation_data or not armature.animation_data.action:
+            self.report({'WARNING'}, "The armature has no action to analyze.")
+            return {'CANCELLED'}
+        
+        try:
+            # Xương đã chọn trong pose mode, nếu không thì các xương hiển thị
+            if context.mode == 'POSE' and context.selected_pose_bones:
+                bone_names = set(bone.name for bone in context.selected_pose_bones)
+            else:
+                bone_names = keyframe_index.get_visible_bones(armature)
+            
+            # Dùng preview range nếu đang bật
+            if scene.use_preview_range:
+                frame_start, frame_end = scene.frame_preview_start, scene.frame_preview_end
+            else:
+                frame_start, frame_end = scene.frame_start, scene.frame_end
+            
+            frames = pose_detection.detect_key_poses(
+                armature.animation_data.action, bone_names, frame_start, frame_end,
+                min_depth=self.min_depth, turn_angle=self.turn_angle,
+                min_turning=self.min_turning, spacing=self.spacing)
+            
+            if not frames:
+                self.report({'WARNING'}, "No key poses found.")
+                return {'CANCELLED'}
+            
+            # Đưa các đề xuất vào store bằng một lần cập nhật
+            store = utils.get_marked_store(scene)
+            if self.replace:
+                changed = store.bulk_update(replace=frames)
+            else:
+                changed = store.bulk_update(add=frames)
+            if changed:
+                # Ghi store ngay để thay đổi nằm trong bước undo của operator này
+                utils.flush_marked_store(scene)
+                utils.refresh_marked_keyframes(scene, preserve_ui_items=True)
+            self.report({'INFO'}, f"Proposed {len(frames)} key poses")
+            
+        except Exception as e:
+            self.report({'ERROR'}, f"Error detecting key poses: {e}")
+            return {'CANCELLED'}
+        
+        return {'FINISHED'}
+
 # Operator để xóa tất cả keyframes đã đánh dấu
 class CASCADEUR_OT_clear_all_keyframes(Operator):
     bl_idname = "cascadeur.clear_all_keyframes"
@@ -361,21 +545,17 @@ class CASCADEUR_OT_clear_all_keyframes(Operator):
             # Lưu frame hiện tại để khôi phục sau
             current_frame = scene.frame_current
             
-            # Theo dõi tất cả frames trong UI list
-            all_frames = [item.frame for item in scene.cascadeur_export.keyframe_items]
+            # Xóa store nhưng giữ lại các mục UI
+            store = utils.get_marked_store(scene)
+            if store.clear():
+                utils.schedule_marked_store_flush(scene)
+                # Đặt tất cả các mục UI thành không đánh dấu và xóa markers
+                utils.refresh_marked_keyframes(scene, preserve_ui_items=True)
             
-            # Lưu dictionary trống ngược vào thuộc tính nhưng giữ lại các mục UI
-            if utils.set_marked_keyframes(scene, {}, preserve_ui_items=True):
-                # Đặt rõ ràng tất cả các mục UI thành không đánh dấu
-                for item in scene.cascadeur_export.keyframe_items:
-                    item.is_marked = False
-                
-                # Khôi phục frame để tránh nhảy timeline
-                scene.frame_current = current_frame
-                
-                self.report({'INFO'}, "Cleared all keyframe marks")
-            else:
-                self.report({'ERROR'}, "Failed to clear keyframe marks. Please try again.")
+            # Khôi phục frame để tránh nhảy timeline
+            scene.frame_current = current_frame
+            
+            self.report({'INFO'}, "Cleared all keyframe marks")
                 
         except Exception as e:
             self.report({'ERROR'}, f"Error clearing keyframes: {e}")
@@ -407,9 +587,7 @@ class CASCADEUR_OT_toggle_markers(Operator):
                     self.report({'ERROR'}, "Failed to update timeline markers")
             else:
                 # Xóa tất cả cascadeur markers
-                for marker in list(scene.timeline_markers):
-                    if marker.name.startswith("Key:"):
-                        scene.timeline_markers.remove(marker)
+                utils.clear_timeline_markers(scene)
                 self.report({'INFO'}, "Timeline markers hidden")
             
             # Khôi phục frame hiện tại để tránh nhảy timeline
@@ -439,8 +617,12 @@ class CASCADEUR_OT_refresh_keyframe_list(Operator):
             # Cập nhật danh sách
             if utils.update_keyframe_list(context.scene):
                 # Khôi phục cài đặt bộ lọc
-                context.scene.cascadeur_export.list_filter.filter_string = filter_str
-                context.scene.cascadeur_export.list_filter.filter_state = filter_state
+                # (chỉ khi đã đổi, vì gán lại sẽ đưa danh sách phân trang về trang đầu)
+                list_filter = context.scene.cascadeur_export.list_filter
+                if list_filter.filter_string != filter_str:
+                    list_filter.filter_string = filter_str
+                if list_filter.filter_state != filter_state:
+                    list_filter.filter_state = filter_state
                 
                 # Khôi phục frame hiện tại để tránh nhảy timeline
                 context.scene.frame_current = current_frame
@@ -455,6 +637,93 @@ class CASCADEUR_OT_refresh_keyframe_list(Operator):
             
         return {'FINISHED'}
 
+# Operator để chuyển trang trong chế độ danh sách phân trang
+class CASCADEUR_OT_keyframe_list_page(Operator):
+    bl_idname = "cascadeur.keyframe_list_page"
+    bl_label = "Change Page"
+    bl_description = "Show another page of the keyframe list"
+    
+    action: EnumProperty(
+        name="Action",
+        items=[
+            ('FIRST', "First", "Go to the first page"),
+            ('PREVIOUS', "Previous", "Go to the previous page"),
+            ('NEXT', "Next", "Go to the next page"),
+            ('LAST', "Last", "Go to the last page"),
+        ],
+        default='NEXT'
+    )
+    
+    def execute(self, context):
+        scene = context.scene
+        info = utils.get_keyframe_page_info(scene)
+        if info is None:
+            return {'CANCELLED'}
+        
+        page, page_count, _ = info
+        target = {
+            'FIRST': 0,
+            'PREVIOUS': page - 1,
+            'NEXT': page + 1,
+            'LAST': page_count - 1,
+        }[self.action]
+        target = max(0, min(target, page_count - 1))
+        if target == page:
+            return {'CANCELLED'}
+        
+        utils.update_keyframe_page(scene, page=target)
+        return {'FINISHED'}
+
+# Operator để nhảy tới trang chứa một frame trong chế độ danh sách phân trang
+class CASCADEUR_OT_keyframe_list_jump(Operator):
+    bl_idname = "cascadeur.keyframe_list_jump"
+    bl_label = "Jump to Frame"
+    bl_description = "Show the page holding a frame (the current frame by default) and select it"
+    
+    frame: IntProperty(name="Frame", description="Frame to show in the list")
+    use_current_frame: BoolProperty(
+        name="Current Frame",
+        description="Jump to the current frame instead of the given one",
+        default=True,
+        options={'SKIP_SAVE'}
+    )
+    
+    def invoke(self, context, event):
+        if self.use_current_frame:
+            return self.execute(context)
+        # Hỏi số frame
+        self.frame = context.scene.frame_current
+        return context.window_manager.invoke_props_dialog(self)
+    
+    def execute(self, context):
+        scene = context.scene
+        frame = scene.frame_current if self.use_current_frame else self.frame
+        try:
+            if scene.cascadeur_export.paginate_list:
+                utils.update_keyframe_page(scene, select_frame=frame)
+            else:
+                frames = utils.get_keyframe_item_frames(scene.cascadeur_export.keyframe_items)
+                if frames:
+                    scene.cascadeur_export["keyframe_index"] = min(bisect_left(frames, frame), len(frames) - 1)
+        except Exception as e:
+            self.report({'ERROR'}, f"Error jumping to frame: {e}")
+            return {'CANCELLED'}
+        
+        return {'FINISHED'}
+
+# Operator để dừng quét keyframe của cả scene
+class CASCADEUR_OT_cancel_keyframe_scan(Operator):
+    bl_idname = "cascadeur.cancel_keyframe_scan"
+    bl_label = "Cancel Scan"
+    bl_description = "Stop scanning the scene for keyframes (the list keeps the keyframes found so far)"
+    
+    def execute(self, context):
+        job = keyframe_scan.cancel_scan(context.scene)
+        if job is None:
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Keyframe scan stopped after {job.done} of {job.total} objects")
+        return {'FINISHED'}
+
 # Đăng ký
 classes = (
     CASCADEUR_UL_keyframe_list,
@@ -463,13 +732,24 @@ classes = (
     CASCADEUR_OT_mark_keyframe,
     CASCADEUR_OT_unmark_keyframe,
     CASCADEUR_OT_mark_all_keyframes,
+    CASCADEUR_OT_detect_key_poses,
+    CASCADEUR_OT_mark_all_targets,
+    CASCADEUR_OT_clear_all_targets,
     CASCADEUR_OT_clear_all_keyframes,
     CASCADEUR_OT_toggle_markers,
     CASCADEUR_OT_refresh_keyframe_list,
+    CASCADEUR_OT_cancel_keyframe_scan,
+    CASCADEUR_OT_keyframe_list_page,
+    CASCADEUR_OT_keyframe_list_jump,
 )
 
 def register():
     for cls in classes:
+        # Đo thời gian các operator khi profiling được bật
+        if cls.__name__.startswith("CASCADEUR_OT_"):
+            profiling.instrument_class(cls)
+        elif cls is CASCADEUR_UL_keyframe_list:
+            profiling.instrument_class(cls, ("filter_items",))
         bpy.utils.register_class(cls)
 
 def unregister():
@@ -0,0 +1,223 @@
+import bpy
+import time
+from . import keyframe_index
+from . import profiling
+
+# Time-sliced scan of every animated object in a scene.
+# Used for the keyframe list when no armature is set: scenes full of set
+# dressing can hold thousands of animated objects, and walking them in one go
+# freezes Blender. The scan is a generator that handles one object per step;
+# a bpy.app.timers callback runs it for TICK_BUDGET seconds per tick and merges
+# the frames found so far into the list, so the list fills in as it goes.
+
+# Seconds of work per timer tick
+TICK_BUDGET = 0.008
+
+# Seconds between ticks (0 lets Blender handle events in between)
+TICK_INTERVAL = 0.0
+
+# Scan the animated objects of a scene one object per step
+# Frames are collected into `frames` (a set), or into `times` ({frame: time}) when
+# a subframe tolerance is given; yields the number of objects done after each one.
+# Objects sharing an action are scanned and merged once (see keyframe_index.ActionCollector).
+def iter_scene_keyframes(objects, frames, times=None, tolerance=None):
+    collector = keyframe_index.ActionCollector(tolerance)
+    try:
+        for done, obj in enumerate(objects, 1):
+            try:
+                key = collector.group_key(obj)
+                if key is None:
+                    pass
+                elif key in collector.results:
+                    # Same action as an object already merged, nothing new to add
+                    collector.reused += 1
+                else:
+                    result = collector.collect(obj)
+                    if tolerance is not None:
+                        for frame, time_ in result.items():
+                            current = times.get(frame)
+                            if current is None or abs(time_ - frame) < abs(current - frame):
+                                times[frame] = time_
+                    else:
+                        frames.update(result)
+            except ReferenceError:
+                # Object deleted while the scan was running
+                pass
+            yield done
+    finally:
+        # Also runs when a cancelled scan is closed, so its stats are recorded
+        collector.report()
+
+# One running scan
+class ScanJob:
+    # shown: frames already in the list, kept until the scan finishes
+    def __init__(self, scene, tolerance, shown=()):
+        from . import utils
+        self.scene = scene
+        self.shown = set(shown)
+        self.key = utils.scene_key(scene)
+        self.objects = list(scene.objects)
+        self.total = len(self.objects)
+        self.done = 0
+        self.frames = set()
+        self.tolerance = tolerance
+        self.times = {} if tolerance is not None else None
+        self.steps = iter_scene_keyframes(self.objects, self.frames, self.times, tolerance)
+        self.finished = False
+        self.cancelled = False
+        # Frame count at the last list update, the list is only touched when it grew
+        self.applied = -1
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    # Sorted frames found so far
+    # While running, frames listed before the scan stay in (a rescan must not empty the list).
+    def result(self):
+        found = self.times.keys() if self.times is not None else self.frames
+        if self.finished or not self.shown:
+            return sorted(found)
+        return sorted(self.shown.union(found))
+
+    # Run scan steps until the time budget is spent, returns True once every object is done
+    def run(self, budget):
+        deadline = time.perf_counter() + budget
+        for self.done in self.steps:
+            if time.perf_counter() >= deadline:
+                return False
+        self.finished = True
+        self.objects = []
+        self.shown = set()
+        return True
+
+# Running scans, keyed by scene_key
+_jobs = {}
+
+# Get the running scan of a scene (None if there is none)
+def get_scan(scene):
+    from . import utils
+    return _jobs.get(utils.scene_key(scene))
+
+# Helper function to push the frames found so far into the keyframe list
+def _apply(job):
+    from . import utils
+    count = len(job.times if job.times is not None else job.frames)
+    if job.finished or count != job.applied:
+        job.applied = count
+        utils.apply_keyframe_list(job.scene, job.result())
+
+# Timer callback - advance every running scan within the tick budget
+@profiling.profiled()
+def _tick():
+    from . import refresh_scheduler
+    budget = TICK_BUDGET / max(1, len(_jobs))
+    for key, job in list(_jobs.items()):
+        try:
+            done = job.done
+            if job.run(budget):
+                del _jobs[key]
+            _apply(job)
+            profiling.add_items(job.done - done)
+        except ReferenceError:
+            # Scene deleted while scanning
+            _jobs.pop(key, None)
+        except Exception as e:
+            _jobs.pop(key, None)
+            print(f"Error scanning keyframes: {e}")
+    refresh_scheduler.tag_redraw()
+    return TICK_INTERVAL if _jobs else None
+
+# Start the keyframe scan of a scene, returns the ScanJob
+# A scan already running with the same tolerance is kept. The first slice runs
+# right away, so small scenes are done before this returns.
+def start_scan(scene, tolerance=None):
+    from . import utils
+    running = _jobs.get(utils.scene_key(scene))
+    if running is not None and running.tolerance == tolerance:
+        return running
+
+    job = ScanJob(scene, tolerance, utils.get_keyframe_list_frames(scene))
+    _jobs[job.key] = job
+
+    if bpy.app.background:
+        # No event loop to run timers, scan everything now
+        job.run(float("inf"))
+    else:
+        job.run(TICK_BUDGET)
+    if job.finished:
+        del _jobs[job.key]
+    _apply(job)
+
+    if _jobs and not bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.register(_tick, first_interval=TICK_INTERVAL)
+    return job
+
+# Stop the scan of a scene, the list keeps the frames found so far
+def cancel_scan(scene):
+    from . import utils
+    job = _jobs.pop(utils.scene_key(scene), None)
+    if job is not None:
+        job.cancelled = True
+        job.steps.close()
+    return job
+
+# Stop every scan (add-on disabled)
+def cancel_all():
+    for job in _jobs.values():
+        job.cancelled = True
+        job.steps.close()
+    _jobs.clear()
+    if bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.unregister(_tick)
+
+# Scans stopped by an undo/redo, restarted once the data is back: scene_key -> tolerance
+_interrupted = {}
+
+# Load/undo/redo pre handler - the objects held by running scans are about to be freed
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def interrupt_scans(*args):
+    for key, job in _jobs.items():
+        _interrupted[key] = job.tolerance
+    cancel_all()
+
+# Undo/redo post handler - scan the scenes that were interrupted again
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def resume_scans(*args):
+    from . import utils
+    interrupted = dict(_interrupted)
+    _interrupted.clear()
+    for scene in bpy.data.scenes:
+        key = utils.scene_key(scene)
+        if key in interrupted:
+            start_scan(scene, interrupted[key])
+
+# Load post handler - scans of the old file are not resumed
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def forget_interrupted(*args):
+    _interrupted.clear()
+
+def register():
+    for handlers in (bpy.app.handlers.load_pre, bpy.app.handlers.undo_pre, bpy.app.handlers.redo_pre):
+        if interrupt_scans not in handlers:
+            handlers.append(interrupt_scans)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if resume_scans not in handlers:
+            handlers.append(resume_scans)
+    if forget_interrupted not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(forget_interrupted)
+
+def unregister():
+    for handlers in (bpy.app.handlers.load_pre, bpy.app.handlers.undo_pre, bpy.app.handlers.redo_pre):
+        if interrupt_scans in handlers:
+            handlers.remove(interrupt_scans)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if resume_scans in handlers:
+            handlers.remove(resume_scans)
+    if forget_interrupted in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(forget_interrupted)
+    cancel_all()
+    _interrupted.clear()
@@ -0,0 +1,192 @@
+import json
+from array import array
+from bisect import bisect_left
+
+# Saved format of the marks (the owner's "marked_format" ID property)
+#   1 (or missing): JSON string property {"12": {}, "40": {"time": 39.98}, ...}
+#   2: "marked_frames" sorted int32 ID property array, read as raw bytes without parsing,
+#      and "marked_metadata" ID property group {"40": {"time": 39.98}} for the frames
+#      that have metadata (a JSON string if the metadata is not storable as ID properties)
+STORAGE_VERSION = 2
+FORMAT_KEY = "marked_format"
+FRAMES_KEY = "marked_frames"
+METADATA_KEY = "marked_metadata"
+
+# Helper function to read an int ID property array into array('i') (memory copy when possible)
+def _read_int_array(value):
+    frames = array('i')
+    try:
+        view = memoryview(value)
+    except TypeError:
+        # Older Blender versions without the buffer protocol on ID property arrays
+        return array('i', value)
+    if view.itemsize == frames.itemsize:
+        frames.frombytes(view.tobytes())
+    else:
+        frames.extend(view.tolist())
+    return frames
+
+# Helper function to read the metadata group into {frame: dict}
+def _read_metadata(value):
+    if value is None:
+        return {}
+    if isinstance(value, str):
+        value = json.loads(value)
+    elif hasattr(value, "to_dict"):
+        value = value.to_dict()
+    return {int(frame): dict(data) for frame, data in value.items() if data}
+
+# In-memory set of marked keyframes for one scene
+# Frames live in a sorted int array, metadata in a per-frame dict.
+# The scene property is only written when the store is flushed.
+class MarkedKeyframeStore:
+    def __init__(self, frames=(), metadata=None):
+        self.frames = array('i', sorted(set(int(f) for f in frames)))
+        self.metadata = {}
+        if metadata:
+            for frame, data in metadata.items():
+                if data:
+                    self.metadata[int(frame)] = dict(data)
+        # Set when the in-memory state differs from the scene property
+        self.dirty = False
+        # Bumped on every change so views can tell when to resync
+        self.version = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def _changed(self):
+        self.dirty = True
+        self.version += 1
+
+    def contains(self, frame):
+        i = bisect_left(self.frames, frame)
+        return i < len(self.frames) and self.frames[i] == frame
+
+    def get_metadata(self, frame):
+        return self.metadata.get(frame, {})
+
+    # Mark a frame, returns True if the store changed
+    def add(self, frame, metadata=None):
+        frame = int(frame)
+        i = bisect_left(self.frames, frame)
+        changed = False
+        if i == len(self.frames) or self.frames[i] != frame:
+            self.frames.insert(i, frame)
+            changed = True
+        if metadata:
+            self.metadata[frame] = dict(metadata)
+            changed = True
+        if changed:
+            self._changed()
+        return changed
+
+    # Unmark a frame, returns True if the store changed
+    def remove(self, frame):
+        frame = int(frame)
+        i = bisect_left(self.frames, frame)
+        if i == len(self.frames) or self.frames[i] != frame:
+            return False
+        del self.frames[i]
+        self.metadata.pop(frame, None)
+        self._changed()
+        return True
+
+    # Add and remove many frames at once, or replace the whole set
+    # metadata ({frame: dict}) is set for the given frames that end up marked
+    def bulk_update(self, add=(), remove=(), replace=None, metadata=None):
+        if replace is not None:
+            frames = set(int(f) for f in replace)
+        else:
+            frames = set(self.frames)
+        frames.update(int(f) for f in add)
+        frames.difference_update(int(f) for f in remove)
+
+        new_metadata = {f: data for f, data in self.metadata.items() if f in frames}
+        if metadata:
+            for frame, data in metadata.items():
+                frame = int(frame)
+                if data and frame in frames:
+                    new_metadata[frame] = dict(data)
+
+        new_frames = array('i', sorted(frames))
+        if new_frames == self.frames and new_metadata == self.metadata:
+            return False
+        self.frames = new_frames
+        self.metadata = new_metadata
+        self._changed()
+        return True
+
+    def clear(self):
+        if not self.frames and not self.metadata:
+            return False
+        self.frames = array('i')
+        self.metadata = {}
+        self._changed()
+        return True
+
+    # Dict form used by the JSON property and the exported metadata
+    def to_dict(self):
+        return {str(frame): dict(self.metadata.get(frame, {})) for frame in self.frames}
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, keyframes_dict):
+        frames = []
+        metadata = {}
+        for frame_str, data in keyframes_dict.items():
+            frame = int(frame_str)
+            frames.append(frame)
+            if isinstance(data, dict) and data:
+                metadata[frame] = data
+        return cls(frames, metadata)
+
+    @classmethod
+    def from_json(cls, json_str):
+        if not isinstance(json_str, str) or not json_str.strip():
+            return cls()
+        return cls.from_dict(json.loads(json_str))
+
+    # Check if an owner (property group) still holds the marks in the JSON format
+    @staticmethod
+    def needs_migration(owner):
+        return owner.get(FORMAT_KEY, 1) < STORAGE_VERSION
+
+    # Load from the ID properties of an owner, falls back to its JSON string property
+    @classmethod
+    def from_id_properties(cls, owner):
+        if cls.needs_migration(owner):
+            return cls.from_json(owner.marked_keyframes)
+        store = cls()
+        frames = owner.get(FRAMES_KEY)
+        if frames is not None:
+            store.frames = _read_int_array(frames)
+        store.metadata = _read_metadata(owner.get(METADATA_KEY))
+        return store
+
+    # Save to the ID properties of an owner in the current format
+    # The JSON string property is emptied, so old files get smaller once saved again.
+    def write_id_properties(self, owner):
+        if self.frames:
+            owner[FRAMES_KEY] = self.frames
+        elif FRAMES_KEY in owner:
+            del owner[FRAMES_KEY]
+
+        if self.metadata:
+            metadata = {str(frame): data for frame, data in self.metadata.items()}
+            try:
+                owner[METADATA_KEY] = metadata
+            except (TypeError, ValueError, OverflowError):
+                # Values ID properties cannot hold (None, nested lists of mixed types...)
+                owner[METADATA_KEY] = json.dumps(metadata)
+        elif METADATA_KEY in owner:
+            del owner[METADATA_KEY]
+
+        owner[FORMAT_KEY] = STORAGE_VERSION
+        if owner.marked_keyframes:
+            owner.marked_keyframes = ""
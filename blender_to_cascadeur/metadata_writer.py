@@ -0,0 +1,155 @@
+import bpy
+import json
+import os
+import stat
+import tempfile
+import threading
+from . import profiling
+
+# Streaming, atomic JSON writer for the exported metadata.
+# Output is encoded piece by piece into a temp file next to the target and
+# renamed over it once complete, so a crash never leaves a truncated file.
+# start_write runs the same writer on a background thread and reports progress
+# through a timer, keeping Blender interactive while large files are written.
+
+# Bytes collected before each write to the temp file
+BUFFER_SIZE = 1 << 20
+
+# Seconds between progress checks of running background writes
+POLL_INTERVAL = 0.1
+
+# Stream a dict as JSON (same output as json.dump(data, f, indent=indent)) into a file object
+# progress(done, total) is called after each top-level entry.
+def _stream_json(f, data, indent, progress=None):
+    if not isinstance(data, dict) or not data:
+        f.write(json.dumps(data, indent=indent))
+        return
+
+    encoder = json.JSONEncoder(indent=indent)
+    pad = " " * indent
+    total = len(data)
+    buffer = ["{\n"]
+    size = 2
+    for done, (key, value) in enumerate(data.items(), 1):
+        buffer.append(f"{pad}{json.dumps(str(key))}: ")
+        # Encoded strings never hold raw newlines, so re-indenting the chunks is safe
+        for chunk in encoder.iterencode(value):
+            chunk = chunk.replace("\n", "\n" + pad)
+            buffer.append(chunk)
+            size += len(chunk)
+        buffer.append(",\n" if done < total else "\n")
+        if size >= BUFFER_SIZE:
+            f.write("".join(buffer))
+            buffer = []
+            size = 0
+        if progress is not None:
+            progress(done, total)
+    buffer.append("}")
+    f.write("".join(buffer))
+
+# Helper function to pick the permissions of the written file (mkstemp creates it private)
+# An existing file keeps its mode; a new one gets the read/write bits of its directory.
+def _file_mode(filepath, directory):
+    try:
+        return stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        return stat.S_IMODE(os.stat(directory).st_mode) & 0o666
+
+# Helper function to write JSON atomically - safe to call from a worker thread
+def _write_json_atomic(filepath, data, indent, progress=None):
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filepath)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            _stream_json(f, data, indent, progress)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, _file_mode(filepath, directory))
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return filepath
+
+# Write data as JSON to filepath atomically (temp file + rename), returns filepath
+@profiling.profiled()
+def write_json(filepath, data, indent=2, progress=None):
+    _write_json_atomic(filepath, data, indent, progress)
+    if isinstance(data, dict):
+        profiling.add_items(len(data))
+    return filepath
+
+# One background write
+class WriteJob:
+    def __init__(self, filepath, data, indent, on_done):
+        self.filepath = filepath
+        self.data = data
+        self.indent = indent
+        self.on_done = on_done
+        self.progress = 0.0
+        self.error = None
+        self.finished = False
+        self.thread = threading.Thread(target=self._run, name="btc-metadata-writer", daemon=True)
+
+    def _set_progress(self, done, total):
+        self.progress = done / total
+
+    def _run(self):
+        try:
+            # Not profiled: the profiler's call stack belongs to the main thread
+            _write_json_atomic(self.filepath, self.data, self.indent, self._set_progress)
+            self.progress = 1.0
+        except Exception as e:
+            self.error = e
+        finally:
+            # The data is not needed anymore, do not keep large exports alive
+            self.data = None
+            self.finished = True
+
+# Background writes that have not been reported yet
+_jobs = []
+
+# Get the background writes still running (for the panel)
+def active_jobs():
+    return [job for job in _jobs if not job.finished]
+
+# Timer callback - redraw progress and report finished writes on the main thread
+def _poll_jobs():
+    from . import refresh_scheduler
+    for job in [job for job in _jobs if job.finished]:
+        _jobs.remove(job)
+        if job.error is not None:
+            print(f"Error writing {job.filepath}: {job.error}")
+        else:
+            print(f"Wrote {job.filepath}")
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                print(f"Error after writing {job.filepath}: {e}")
+    refresh_scheduler.tag_redraw()
+    return POLL_INTERVAL if _jobs else None
+
+# Write data as JSON on a background thread, returns the WriteJob
+# The data must be plain Python (no bpy data), it is read from the other thread.
+# on_done(job) runs on the main thread once the file is in place (or job.error is set).
+def start_write(filepath, data, indent=2, on_done=None):
+    job = WriteJob(filepath, data, indent, on_done)
+    _jobs.append(job)
+    job.thread.start()
+    if bpy.app.background:
+        # No event loop to run timers, finish right away
+        job.thread.join()
+        _poll_jobs()
+    elif not bpy.app.timers.is_registered(_poll_jobs):
+        bpy.app.timers.register(_poll_jobs, first_interval=POLL_INTERVAL)
+    return job
+
+# Wait for every running write (used when the add-on is disabled)
+def wait_all(timeout=None):
+    for job in list(_jobs):
+        job.thread.join(timeout)
+    if bpy.app.timers.is_registered(_poll_jobs):
+        bpy.app.timers.unregister(_poll_jobs)
+    _poll_jobs()
@@ -0,0 +1,262 @@
+import re
+from bisect import bisect_left
+from . import keyframe_index
+from . import profiling
+
+# Proposes key poses from the motion of an armature's bones.
+# Bone fcurves are sampled in bulk (keys and handles read with foreach_get, then the
+# Bezier, linear and constant segments evaluated for all frames at once), per-bone
+# linear and angular velocities are computed with NumPy, and frames are picked at
+# velocity minima and at direction changes.
+
+# NumPy ships with Blender; detection is unavailable without it
+np = keyframe_index.np
+
+# Matches the property part of a pose bone data path, e.g. pose.bones["Bone"].location
+_PROPERTY_RE = re.compile(r'\]\.(location|rotation_quaternion|rotation_euler|rotation_axis_angle)$')
+
+# Channel layout of the sampled arrays: (property, first column, rest value per column)
+_CHANNELS = {
+    "location": (0, (0.0, 0.0, 0.0)),
+    "rotation_quaternion": (3, (1.0, 0.0, 0.0, 0.0)),
+    "rotation_euler": (7, (0.0, 0.0, 0.0)),
+    "rotation_axis_angle": (10, (0.0, 0.0, 1.0, 0.0)),
+}
+CHANNEL_COUNT = 14
+_LOCATION = slice(0, 3)
+_QUATERNION = slice(3, 7)
+_OTHER_ROTATION = slice(7, 14)
+
+# Bones are processed in chunks to keep the sampled arrays small
+BONE_CHUNK = 128
+
+# Speeds below this (relative to the bone's own peak) count as standing still
+_STILL = 1e-3
+
+# Keyframe interpolation modes the sampler evaluates exactly
+# Easing modes (SINE, BACK, ...) are sampled as straight lines between their keys.
+_CONSTANT = 0
+_LINEAR = 1
+_BEZIER = 2
+_INTERPOLATION = {'CONSTANT': _CONSTANT, 'LINEAR': _LINEAR, 'BEZIER': _BEZIER}
+
+# Bisection steps solving x(t) = frame on a Bezier segment (error below 1e-6 of the segment)
+_BEZIER_STEPS = 20
+
+def is_available():
+    return np is not None
+
+# Helper function to collect the fcurves to sample: bone -> [(column, fcurve index)]
+def _bone_channels(action, bone_names):
+    entry = keyframe_index.get_entry(action)
+    fcurves = action.fcurves
+    channels = {}
+    for bone_name in entry.keyed_bones.intersection(bone_names):
+        for i in entry.bone_fcurves[bone_name]:
+            fcurve = fcurves[i]
+            match = _PROPERTY_RE.search(fcurve.data_path)
+            if not match or fcurve.mute:
+                continue
+            first, rest = _CHANNELS[match.group(1)]
+            if fcurve.array_index < len(rest):
+                channels.setdefault(bone_name, []).append((first + fcurve.array_index, i))
+    return channels
+
+# Helper function to build the rest-pose row every bone starts from
+def _rest_row():
+    row = np.zeros(CHANNEL_COUNT, dtype=np.float32)
+    for first, rest in _CHANNELS.values():
+        row[first:first + len(rest)] = rest
+    return row
+
+# Helper function to read the keys of an fcurve in bulk: (co, handle_left, handle_right, modes)
+# Handles and modes are None when the keys do not have them (every segment is then linear).
+def _read_keys(points, count):
+    co = np.empty(count * 2, dtype=np.float64)
+    points.foreach_get("co", co)
+    try:
+        left = np.empty(count * 2, dtype=np.float64)
+        right = np.empty(count * 2, dtype=np.float64)
+        points.foreach_get("handle_left", left)
+        points.foreach_get("handle_right", right)
+    except (AttributeError, TypeError, RuntimeError):
+        return co, None, None, None
+    # interpolation is an enum, which foreach_get cannot read
+    modes = np.fromiter((_INTERPOLATION.get(point.interpolation, _LINEAR) for point in points),
+                        dtype=np.int8, count=count)
+    return co, left, right, modes
+
+# Helper function to evaluate the points of cubic Bezier segments at parameters t
+def _bezier(p0, p1, p2, p3, t):
+    s = 1.0 - t
+    return s * s * s * p0 + 3.0 * s * s * t * p1 + 3.0 * s * t * t * p2 + t * t * t * p3
+
+# Evaluate an fcurve's keys at the given frames, following each segment's interpolation
+# Frames outside the keys hold the first/last value (constant extrapolation).
+def evaluate_keys(frames, co, left=None, right=None, modes=None):
+    x = co[0::2]
+    y = co[1::2]
+    values = np.interp(frames, x, y)
+    if modes is None or len(x) < 2:
+        return values
+
+    segment = np.clip(np.searchsorted(x, frames, side='right') - 1, 0, len(x) - 2)
+    inside = (frames >= x[0]) & (frames < x[-1])
+    mode = modes[segment]
+
+    constant = inside & (mode == _CONSTANT)
+    values[constant] = y[segment[constant]]
+
+    bezier = inside & (mode == _BEZIER)
+    if bezier.any():
+        f = frames[bezier]
+        k = segment[bezier]
+        x0, y0, x3, y3 = x[k], y[k], x[k + 1], y[k + 1]
+        h1x, h1y = right[0::2][k] - x0, right[1::2][k] - y0
+        h2x, h2y = left[0::2][k + 1] - x3, left[1::2][k + 1] - y3
+        # Shrink handles that overlap in time so x(t) is monotonic, as Blender does
+        length = x3 - x0
+        overlap = np.abs(h1x) + np.abs(h2x)
+        scale = np.where(overlap > length, length / np.maximum(overlap, 1e-12), 1.0)
+        x1, y1 = x0 + h1x * scale, y0 + h1y * scale
+        x2, y2 = x3 + h2x * scale, y3 + h2y * scale
+
+        # Solve x(t) = frame for every sample at once
+        low = np.zeros_like(f)
+        high = np.ones_like(f)
+        for _ in range(_BEZIER_STEPS):
+            t = 0.5 * (low + high)
+            before = _bezier(x0, x1, x2, x3, t) < f
+            low = np.where(before, t, low)
+            high = np.where(before, high, t)
+        values[bezier] = _bezier(y0, y1, y2, y3, 0.5 * (low + high))
+    return values
+
+# Sample bones of an action at the given frames, returns an array (bones, frames, CHANNEL_COUNT)
+def sample_bones(action, bone_channels, frames):
+    fcurves = action.fcurves
+    frames = np.asarray(frames, dtype=np.float64)
+    samples = np.empty((len(bone_channels), len(frames), CHANNEL_COUNT), dtype=np.float32)
+    samples[:] = _rest_row()
+    for b, channels in enumerate(bone_channels):
+        for column, i in channels:
+            points = fcurves[i].keyframe_points
+            count = len(points)
+            if not count:
+                continue
+            samples[b, :, column] = evaluate_keys(frames, *_read_keys(points, count))
+    return samples
+
+# Helper function to get 1 / peak per bone, zero for bones that never move
+def _peak_scale(peaks):
+    return np.where(peaks > 0.0, 1.0 / np.where(peaks > 0.0, peaks, 1.0), 0.0).astype(np.float32)
+
+# Motion of a chunk of bones: total normalized speed per frame step (frames - 1)
+# and the number of moving bones that change direction at each inner frame (frames - 2)
+def _chunk_motion(samples, cos_limit):
+    velocity = np.diff(samples, axis=1)
+
+    # Linear speed
+    linear = np.linalg.norm(velocity[:, :, _LOCATION], axis=2)
+
+    # Angular speed - true angle for quaternions, channel delta for euler/axis-angle
+    quats = samples[:, :, _QUATERNION]
+    quats = quats / np.maximum(np.linalg.norm(quats, axis=2, keepdims=True), 1e-8)
+    dots = np.abs(np.sum(quats[:, :-1] * quats[:, 1:], axis=2))
+    angular = 2.0 * np.arccos(np.clip(dots, 0.0, 1.0))
+    angular += np.linalg.norm(velocity[:, :, _OTHER_ROTATION], axis=2)
+
+    # Every bone weighs the same, whatever its range of motion
+    linear_scale = _peak_scale(linear.max(axis=1))
+    angular_scale = _peak_scale(angular.max(axis=1))
+    speed = linear * linear_scale[:, None] + angular * angular_scale[:, None]
+
+    # Direction changes - angle between consecutive (normalized) velocity vectors
+    velocity[:, :, _LOCATION] *= linear_scale[:, None, None]
+    velocity[:, :, 3:] *= angular_scale[:, None, None]
+    dot = np.sum(velocity[:, :-1] * velocity[:, 1:], axis=2)
+    norms = np.linalg.norm(velocity, axis=2)
+    moving = (norms[:, :-1] > _STILL) & (norms[:, 1:] > _STILL)
+    cosine = dot / np.maximum(norms[:, :-1] * norms[:, 1:], 1e-12)
+    turning = moving & (cosine < cos_limit)
+    return speed.sum(axis=0), turning.sum(axis=0), moving.sum(axis=0)
+
+# Helper function to get the largest value around each sample (window on each side)
+def _window_max(values, window, side):
+    padded = np.concatenate((np.full(window, -np.inf), values, np.full(window, -np.inf)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window + 1)
+    if side == 'LEFT':
+        return windows[:len(values)].max(axis=1)
+    return windows[window:window + len(values)].max(axis=1)
+
+# Helper function to keep candidates at least `spacing` frames apart, best first
+def _enforce_spacing(candidates, spacing):
+    accepted = []
+    for frame, _score in sorted(candidates, key=lambda c: c[1]):
+        i = bisect_left(accepted, frame)
+        if i > 0 and frame - accepted[i - 1] < spacing:
+            continue
+        if i < len(accepted) and accepted[i] - frame < spacing:
+            continue
+        accepted.insert(i, frame)
+    return accepted
+
+# Propose key pose frames for bones of an action over a frame range
+# min_depth: how far (relative to the peak speed) speed must dip for a minimum to count
+# turn_angle: direction change (radians) a bone needs to count as turning
+# min_turning: fraction of moving bones that must turn at a frame
+# spacing: minimum distance between proposed frames
+@profiling.profiled()
+def detect_key_poses(action, bone_names, frame_start, frame_end, min_depth=0.1,
+                     turn_angle=1.0, min_turning=0.25, spacing=3, window=5, include_ends=True):
+    if np is None:
+        raise RuntimeError("Key pose detection requires NumPy")
+    if frame_end - frame_start < 2:
+        return list(range(frame_start, frame_end + 1))
+
+    frames = np.arange(frame_start, frame_end + 1, dtype=np.float32)
+    channels = _bone_channels(action, bone_names)
+    count = len(frames)
+
+    speed = np.zeros(count - 1, dtype=np.float64)
+    turning = np.zeros(count - 2, dtype=np.float64)
+    moving = np.zeros(count - 2, dtype=np.float64)
+    bone_list = list(channels.values())
+    cos_limit = np.cos(turn_angle)
+    for start in range(0, len(bone_list), BONE_CHUNK):
+        chunk = sample_bones(action, bone_list[start:start + BONE_CHUNK], frames)
+        chunk_speed, chunk_turning, chunk_moving = _chunk_motion(chunk, cos_limit)
+        speed += chunk_speed
+        turning += chunk_turning
+        moving += chunk_moving
+    profiling.add_items(len(bone_list) * count)
+
+    # Speed at each frame: mean of the steps on both sides
+    frame_speed = np.empty(count, dtype=np.float64)
+    frame_speed[0] = speed[0]
+    frame_speed[-1] = speed[-1]
+    frame_speed[1:-1] = 0.5 * (speed[:-1] + speed[1:])
+    peak = frame_speed.max()
+
+    candidates = []
+    if peak > 0.0:
+        # Velocity minima (first frame of a hold) that dip deep enough below the surrounding peaks
+        inner = frame_speed[1:-1]
+        is_minimum = (inner < frame_speed[:-2]) & (inner <= frame_speed[2:])
+        left = _window_max(frame_speed, window, 'LEFT')[1:-1]
+        right = _window_max(frame_speed, window, 'RIGHT')[1:-1]
+        depth = np.minimum(left, right) - inner
+        for i in np.flatnonzero(is_minimum & (depth >= min_depth * peak)):
+            candidates.append((frame_start + 1 + int(i), inner[i] / peak))
+
+        # Direction changes shared by enough of the moving bones
+        fraction = turning / np.maximum(moving, 1.0)
+        for i in np.flatnonzero((fraction >= min_turning) & (moving > 0)):
+            candidates.append((frame_start + 1 + int(i), 1.0 - fraction[i]))
+
+    if include_ends:
+        # Ends always win over nearby candidates
+        candidates.append((frame_start, -1.0))
+        candidates.append((frame_end, -1.0))
+
+    return _enforce_spacing(candidates, max(1, spacing))
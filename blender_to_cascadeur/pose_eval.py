@@ -0,0 +1,211 @@
+import math
+from array import array
+from . import keyframe_index
+from . import profiling
+
+# Pose evaluation without stepping the scene.
+# Bone channels are computed straight from the action's fcurves at the requested
+# frames (fcurve.evaluate in batch). Only bones whose pose depends on something
+# else (constraints, drivers, NLA) go through a depsgraph evaluation with
+# scene.frame_set, and only when there are such bones.
+#
+# Poses are returned as (frames, bones, CHANNEL_COUNT) float32: location,
+# quaternion rotation (w, x, y, z) and scale of each bone's local transform.
+
+np = keyframe_index.np
+
+CHANNEL_COUNT = 10
+
+# Pose bone channels read from fcurves: property -> size
+_CHANNEL_SIZES = {
+    "location": 3,
+    "rotation_quaternion": 4,
+    "rotation_euler": 3,
+    "rotation_axis_angle": 4,
+    "scale": 3,
+}
+
+# Helper function to multiply quaternion arrays (..., 4) in (w, x, y, z) order
+def _quaternion_multiply(a, b):
+    aw, ax, ay, az = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bw, bx, by, bz = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    return np.stack((
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ), axis=-1)
+
+# Convert euler angles (..., 3) with a Blender rotation order (e.g. 'XYZ') to quaternions
+def euler_to_quaternion(euler, order):
+    half = np.asarray(euler, dtype=np.float64) * 0.5
+    axes = {}
+    for i, axis in enumerate("XYZ"):
+        q = np.zeros(half.shape[:-1] + (4,))
+        q[..., 0] = np.cos(half[..., i])
+        q[..., 1 + i] = np.sin(half[..., i])
+        axes[axis] = q
+    # 'XYZ' applies X first, so the combined rotation is Z * Y * X
+    return _quaternion_multiply(_quaternion_multiply(axes[order[2]], axes[order[1]]), axes[order[0]])
+
+# Convert axis-angle rotations (..., 4) as (angle, x, y, z) to quaternions
+def axis_angle_to_quaternion(axis_angle):
+    axis_angle = np.asarray(axis_angle, dtype=np.float64)
+    axis = axis_angle[..., 1:]
+    length = np.linalg.norm(axis, axis=-1, keepdims=True)
+    axis = np.where(length > 1e-12, axis / np.where(length > 1e-12, length, 1.0), (0.0, 1.0, 0.0))
+    half = axis_angle[..., :1] * 0.5
+    return np.concatenate((np.cos(half), axis * np.sin(half)), axis=-1)
+
+# Helper function to collect bones driven by drivers on the armature object
+def _driven_bones(armature):
+    anim_data = armature.animation_data
+    if not anim_data:
+        return set()
+    bones = set()
+    for driver in anim_data.drivers:
+        bone_name = keyframe_index.parse_bone_name(driver.data_path)
+        if bone_name is not None and not driver.mute:
+            bones.add(bone_name)
+    return bones
+
+# Helper function to collect bones moved by constraints (IK also moves its chain)
+def _constrained_bones(pose_bones):
+    bones = set()
+    for pose_bone in pose_bones:
+        for constraint in pose_bone.constraints:
+            if constraint.mute or constraint.influence <= 0.0:
+                continue
+            bones.add(pose_bone.name)
+            if constraint.type == 'IK':
+                # chain_count 0 means the whole chain up to the root
+                parent = pose_bone.parent
+                remaining = constraint.chain_count - 1 if constraint.chain_count else -1
+                while parent is not None and remaining != 0:
+                    bones.add(parent.name)
+                    parent = parent.parent
+                    remaining -= 1
+    return bones
+
+# Get the bones that cannot be evaluated from the action's fcurves alone
+def find_depsgraph_bones(armature):
+    pose_bones = armature.pose.bones
+    anim_data = armature.animation_data
+    # NLA blending is not reproduced here, evaluate everything through the depsgraph
+    if anim_data and keyframe_index.uses_nla(anim_data):
+        return set(pose_bone.name for pose_bone in pose_bones)
+    return _constrained_bones(pose_bones) | _driven_bones(armature)
+
+# Evaluate one fcurve at many frames
+def evaluate_fcurve(fcurve, frames):
+    evaluate = fcurve.evaluate
+    if np is not None:
+        return np.fromiter((evaluate(frame) for frame in frames), dtype=np.float32, count=len(frames))
+    return [evaluate(frame) for frame in frames]
+
+# Helper function to read the current value of a channel for every pose bone
+def _read_channel(pose_bones, name):
+    size = _CHANNEL_SIZES[name]
+    values = np.empty(len(pose_bones) * size, dtype=np.float32)
+    pose_bones.foreach_get(name, values)
+    return values.reshape(len(pose_bones), size)
+
+# Evaluate the bones that only depend on fcurves, writes into data (frames, bones, channels)
+def _evaluate_from_fcurves(armature, bone_indices, frames, data):
+    pose_bones = armature.pose.bones
+    action = armature.animation_data.action if armature.animation_data else None
+    frame_count = len(frames)
+
+    # Channels that are not animated keep their current value, like after a frame change
+    channels = {}
+    for name in _CHANNEL_SIZES:
+        current = _read_channel(pose_bones, name)
+        channels[name] = np.repeat(current[None, :, :], frame_count, axis=0)
+
+    evaluated = 0
+    if action is not None:
+        entry = keyframe_index.get_entry(action)
+        fcurves = action.fcurves
+        for bone_name, b in bone_indices.items():
+            for i in entry.bone_fcurves.get(bone_name, ()):
+                fcurve = fcurves[i]
+                if fcurve.mute:
+                    continue
+                name = fcurve.data_path.rsplit(".", 1)[-1]
+                if name in channels and fcurve.array_index < _CHANNEL_SIZES[name]:
+                    channels[name][:, b, fcurve.array_index] = evaluate_fcurve(fcurve, frames)
+                    evaluated += 1
+    profiling.add_items(evaluated * frame_count)
+
+    indices = list(bone_indices.values())
+    data[:, indices, 0:3] = channels["location"][:, indices]
+    data[:, indices, 7:10] = channels["scale"][:, indices]
+
+    # Rotations end up as quaternions, converted in bulk per rotation mode
+    modes = {}
+    for b in indices:
+        modes.setdefault(pose_bones[b].rotation_mode, []).append(b)
+    for mode, mode_indices in modes.items():
+        if mode == 'QUATERNION':
+            data[:, mode_indices, 3:7] = channels["rotation_quaternion"][:, mode_indices]
+        elif mode == 'AXIS_ANGLE':
+            data[:, mode_indices, 3:7] = axis_angle_to_quaternion(channels["rotation_axis_angle"][:, mode_indices])
+        else:
+            data[:, mode_indices, 3:7] = euler_to_quaternion(channels["rotation_euler"][:, mode_indices], mode)
+
+# Helper function to get the local transform of a pose bone after the depsgraph ran (constraints included)
+def _evaluated_channels(armature, pose_bone):
+    matrix = armature.convert_space(pose_bone=pose_bone, matrix=pose_bone.matrix,
+                                    from_space='POSE', to_space='LOCAL')
+    location, rotation, scale = matrix.decompose()
+    return tuple(location) + tuple(rotation) + tuple(scale)
+
+# Evaluate bones through the depsgraph, one scene.frame_set per frame
+# write(f, b, channels) stores the result of bone b at the f-th frame.
+# Frames may be subframe times (subframe precision mode).
+def _evaluate_with_depsgraph(scene, armature, bone_indices, frames, write):
+    pose_bones = armature.pose.bones
+    current_frame = scene.frame_current
+    current_subframe = getattr(scene, "frame_subframe", 0.0)
+    try:
+        for f, frame in enumerate(frames):
+            whole = math.floor(frame)
+            scene.frame_set(int(whole), subframe=frame - whole)
+            for bone_name, b in bone_indices.items():
+                write(f, b, _evaluated_channels(armature, pose_bones[b]))
+    finally:
+        scene.frame_set(current_frame, subframe=current_subframe)
+    profiling.add_items(len(bone_indices) * len(frames))
+
+# Evaluate the local transform of every pose bone at the given frames
+# Returns (bone names, data); data is a NumPy array (frames, bones, CHANNEL_COUNT),
+# or a flat array('f') in the same order without NumPy.
+@profiling.profiled()
+def evaluate_poses(scene, armature, frames):
+    pose_bones = armature.pose.bones
+    bone_names = [pose_bone.name for pose_bone in pose_bones]
+
+    if np is None:
+        # No bulk math available - let the depsgraph evaluate every bone
+        rows = [[None] * len(bone_names) for _ in frames]
+        def write_row(f, b, channels):
+            rows[f][b] = channels
+        _evaluate_with_depsgraph(scene, armature, {name: b for b, name in enumerate(bone_names)}, frames, write_row)
+        data = array('f')
+        for row in rows:
+            for channels in row:
+                data.extend(channels)
+        return bone_names, data
+
+    depsgraph_bones = find_depsgraph_bones(armature)
+    direct = {name: b for b, name in enumerate(bone_names) if name not in depsgraph_bones}
+    evaluated = {name: b for b, name in enumerate(bone_names) if name in depsgraph_bones}
+
+    data = np.empty((len(frames), len(bone_names), CHANNEL_COUNT), dtype=np.float32)
+    if direct:
+        _evaluate_from_fcurves(armature, direct, frames, data)
+    if evaluated:
+        def write_data(f, b, channels):
+            data[f, b] = channels
+        _evaluate_with_depsgraph(scene, armature, evaluated, frames, write_data)
+    return bone_names, data
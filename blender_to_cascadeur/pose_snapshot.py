@@ -0,0 +1,107 @@
+import json
+import os
+import sys
+from array import array
+from . import keyframe_index
+from . import pose_eval
+from . import profiling
+
+# Compact pose snapshots of the marked frames, written next to *_keyframes.json
+# so key poses can go to Cascadeur without a full FBX export.
+#
+# Files:
+#   <base>_poses.json  header (frames, bones, channels, shape, data file name)
+#   <base>_poses.npy   NumPy array, or
+#   <base>_poses.bin   flat little-endian float32 when NumPy is not available
+# Both data files hold float32 values in C order with shape (frames, bones, channels):
+# the local transform of every pose bone at every marked frame.
+
+np = keyframe_index.np
+
+SNAPSHOT_VERSION = 1
+
+# Per-bone channel layout - rotations are always written as quaternions (w, x, y, z)
+CHANNELS = (
+    "location_x", "location_y", "location_z",
+    "rotation_w", "rotation_x", "rotation_y", "rotation_z",
+    "scale_x", "scale_y", "scale_z",
+)
+CHANNEL_COUNT = pose_eval.CHANNEL_COUNT
+
+# Helper function to get the header and data paths for a keyframe metadata path
+def snapshot_paths(metadata_path, binary_format=None):
+    base = metadata_path[:-5] if metadata_path.lower().endswith('.json') else metadata_path
+    if base.endswith("_keyframes"):
+        base = base[:-len("_keyframes")]
+    if binary_format is None:
+        binary_format = "npy" if np is not None else "float32le"
+    extension = ".npy" if binary_format == "npy" else ".bin"
+    return f"{base}_poses.json", f"{base}_poses{extension}"
+
+# Get the local transform of every pose bone at the given frames, returns (bone names, data)
+# Bones are evaluated from their fcurves without stepping the scene (see pose_eval).
+def sample_poses(scene, armature, frames):
+    return pose_eval.evaluate_poses(scene, armature, frames)
+
+# Write a snapshot next to the keyframe metadata, returns (header path, data path)
+@profiling.profiled()
+def write_pose_snapshot(metadata_path, bone_names, frames, data, armature_name="", fps=None):
+    binary_format = "npy" if np is not None and not isinstance(data, array) else "float32le"
+    header_path, data_path = snapshot_paths(metadata_path, binary_format)
+
+    directory = os.path.dirname(header_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    if binary_format == "npy":
+        np.save(data_path, np.ascontiguousarray(data, dtype='<f4'))
+    else:
+        values = array('f', data)
+        if sys.byteorder != "little":
+            values.byteswap()
+        with open(data_path, "wb") as f:
+            values.tofile(f)
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "format": binary_format,
+        "data": os.path.basename(data_path),
+        "dtype": "<f4",
+        "shape": [len(frames), len(bone_names), CHANNEL_COUNT],
+        "layout": "frames x bones x channels, C order",
+        "channels": list(CHANNELS),
+        "frames": [int(frame) for frame in frames],
+        "bones": list(bone_names),
+        "armature": armature_name,
+        "fps": fps,
+    }
+    with open(header_path, "w") as f:
+        json.dump(header, f, indent=2)
+    return header_path, data_path
+
+# Read a snapshot from its header path, returns (header, data)
+# With NumPy the data is a (frames, bones, channels) array, memory-mapped by default;
+# without NumPy it is a flat array('f').
+def load_pose_snapshot(header_path, mmap=True):
+    with open(header_path) as f:
+        header = json.load(f)
+    data_path = os.path.join(os.path.dirname(header_path), header["data"])
+    shape = tuple(header["shape"])
+
+    if np is not None:
+        if header["format"] == "npy":
+            data = np.load(data_path, mmap_mode='r' if mmap else None)
+        elif mmap:
+            data = np.memmap(data_path, dtype='<f4', mode='r', shape=shape)
+        else:
+            data = np.fromfile(data_path, dtype='<f4').reshape(shape)
+        return header, data
+
+    if header["format"] == "npy":
+        raise RuntimeError("Reading .npy snapshots requires NumPy")
+    data = array('f')
+    with open(data_path, "rb") as f:
+        data.frombytes(f.read())
+    if sys.byteorder != "little":
+        data.byteswap()
+    return header, data
@@ -0,0 +1,143 @@
+import csv
+import functools
+import json
+import os
+import time
+from collections import deque
+
+# Opt-in profiling for the add-on's hot paths (utils functions, handlers,
+# operators and the panel draw). When disabled every wrapper is a single flag check.
+
+# Is profiling currently recording (toggle from the Profiling sub-panel)
+_enabled = os.environ.get("BTC_PROFILE", "") not in ("", "0")
+
+# Number of latest samples kept per entry for the percentiles
+MAX_SAMPLES = 2048
+
+# Timing statistics for one profiled function
+class ProfileStat:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.items = 0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "count": self.count,
+            "total_ms": self.total * 1000.0,
+            "mean_ms": (self.total / self.count * 1000.0) if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000.0,
+            "p95_ms": self.percentile(0.95) * 1000.0,
+            "max_ms": self.max * 1000.0,
+            "items": self.items,
+        }
+
+# Name -> ProfileStat
+_stats = {}
+# Names of the profiled calls currently running, innermost last
+_active = []
+
+def is_enabled():
+    return _enabled
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+def reset():
+    _stats.clear()
+
+def _get_stat(name):
+    stat = _stats.get(name)
+    if stat is None:
+        stat = _stats[name] = ProfileStat(name)
+    return stat
+
+# Record how many items the innermost running profiled call processed
+def add_items(count, name=None):
+    if not _enabled:
+        return
+    if name is None:
+        if not _active:
+            return
+        name = _active[-1]
+    _get_stat(name).items += count
+
+# Record a duration measured elsewhere (e.g. registration time)
+def record(name, seconds, items=0):
+    stat = _get_stat(name)
+    stat.add(seconds)
+    stat.items += items
+
+# Decorator that times a function while profiling is enabled
+def profiled(name=None):
+    def decorator(func):
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            _active.append(label)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _active.pop()
+                _get_stat(label).add(elapsed)
+
+        wrapper._btc_profiled = True
+        return wrapper
+    return decorator
+
+# Wrap methods of a Blender class (operator execute/invoke, panel draw) before registration
+def instrument_class(cls, method_names=("execute", "invoke", "modal")):
+    for method_name in method_names:
+        method = cls.__dict__.get(method_name)
+        if method is None or getattr(method, "_btc_profiled", False):
+            continue
+        setattr(cls, method_name, profiled(f"{cls.__name__}.{method_name}")(method))
+
+# Report rows sorted by total time, most expensive first
+def get_report():
+    return sorted((stat.as_dict() for stat in _stats.values()), key=lambda row: row["total_ms"], reverse=True)
+
+REPORT_FIELDS = ("name", "count", "total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms", "items")
+
+# Write the report as CSV (for .csv paths) or JSON, returns the path written
+def dump(filepath):
+    rows = get_report()
+    directory = os.path.dirname(filepath)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    if filepath.lower().endswith(".csv"):
+        with open(filepath, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        if not filepath.lower().endswith(".json"):
+            filepath += ".json"
+        with open(filepath, "w") as f:
+            json.dump({"enabled": _enabled, "entries": rows}, f, indent=2)
+    return filepath
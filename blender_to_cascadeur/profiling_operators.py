@@ -0,0 +1,82 @@
+import bpy
+import os
+from bpy.types import Operator
+from bpy.props import StringProperty
+from . import profiling
+
+# Operator để bật/tắt ghi profiling
+class CASCADEUR_OT_toggle_profiling(Operator):
+    bl_idname = "cascadeur.toggle_profiling"
+    bl_label = "Toggle Profiling"
+    bl_description = "Start/stop recording timings of the add-on's handlers, operators and panel"
+
+    def execute(self, context):
+        profiling.set_enabled(not profiling.is_enabled())
+        state = "enabled" if profiling.is_enabled() else "disabled"
+        self.report({'INFO'}, f"Profiling {state}")
+        return {'FINISHED'}
+
+# Operator để xóa số liệu profiling
+class CASCADEUR_OT_reset_profiling(Operator):
+    bl_idname = "cascadeur.reset_profiling"
+    bl_label = "Reset Profiling"
+    bl_description = "Clear all recorded timings"
+
+    def execute(self, context):
+        profiling.reset()
+        self.report({'INFO'}, "Profiling data cleared")
+        return {'FINISHED'}
+
+# Operator để xuất số liệu profiling ra JSON hoặc CSV
+class CASCADEUR_OT_dump_profiling(Operator):
+    bl_idname = "cascadeur.dump_profiling"
+    bl_label = "Save Profile"
+    bl_description = "Save recorded timings to a JSON or CSV file"
+
+    filepath: StringProperty(
+        name="Save Path",
+        description="Path of the report (.json or .csv)",
+        default="//",
+        subtype='FILE_PATH'
+    )
+    filter_glob: StringProperty(default="*.json;*.csv", options={'HIDDEN'})
+
+    def invoke(self, context, event):
+        # Đặt tên file mặc định dựa trên file blend
+        blend_path = bpy.data.filepath
+        if blend_path:
+            dir_path = os.path.dirname(blend_path)
+            filename = os.path.splitext(os.path.basename(blend_path))[0]
+            self.filepath = os.path.join(dir_path, f"{filename}_btc_profile.json")
+        else:
+            self.filepath = "btc_profile.json"
+
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        try:
+            filepath = profiling.dump(bpy.path.abspath(self.filepath))
+            self.report({'INFO'}, f"Saved profile to {filepath}")
+            return {'FINISHED'}
+        except Exception as e:
+            self.report({'ERROR'}, f"Error saving profile: {e}")
+            return {'CANCELLED'}
+
+# Đăng ký
+classes = (
+    CASCADEUR_OT_toggle_profiling,
+    CASCADEUR_OT_reset_profiling,
+    CASCADEUR_OT_dump_profiling,
+)
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in reversed(classes):
+        try:
+            bpy.utils.unregister_class(cls)
+        except:
+            pass
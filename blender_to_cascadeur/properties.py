@@ -1,6 +1,6 @@
 import bpy
 from bpy.props import (BoolProperty, StringProperty, EnumProperty, 
-                      IntProperty, PointerProperty, CollectionProperty)
+                      IntProperty, FloatProperty, PointerProperty, CollectionProperty)
 from bpy.types import PropertyGroup
 
 # Define keyframe item for UIList
@@ -12,12 +12,20 @@ class KeyframeListItem(PropertyGroup):
         default=True
     )
 
+# Paginated mode filters the whole frame list, not only the items of the page
+def refresh_keyframe_page(self, context):
+    settings = context.scene.cascadeur_export
+    if settings.paginate_list:
+        from . import utils
+        utils.update_keyframe_page(context.scene, page=0)
+
 # Define filter options for UIList
 class KeyframeListFilter(PropertyGroup):
     filter_string: StringProperty(
         name="Search",
         description="Filter keyframes by frame number",
-        default=""
+        default="",
+        update=refresh_keyframe_page
     )
     filter_state: EnumProperty(
         name="Filter",
@@ -27,8 +35,39 @@ class KeyframeListFilter(PropertyGroup):
             ('MARKED', "Marked", "Show only marked keyframes"),
             ('UNMARKED', "Unmarked", "Show only unmarked keyframes")
         ],
-        default='ALL'
+        default='ALL',
+        update=refresh_keyframe_page
+    )
+
+# One character of the multi-armature mode, with its own marked keyframes
+class ArmatureTarget(PropertyGroup):
+    armature: PointerProperty(
+        type=bpy.types.Object,
+        name="Armature",
+        description="Armature of this character",
+        poll=lambda self, obj: obj.type == 'ARMATURE'
+    )
+    enabled: BoolProperty(
+        name="Enabled",
+        description="Include this armature in Mark All and Export All",
+        default=True
+    )
+    marked_keyframes: StringProperty(
+        name="Marked Keyframes",
+        description="Marked keyframes of this armature as JSON (old format, migrated on load)",
+        default="{}",
     )
+    # Marks of the active target live in the scene's marked frames while it is active
+    # (saved as ID properties, see keyframe_store)
+    is_active: BoolProperty(default=False, options={'HIDDEN'})
+    # Cost of the last Mark All / Export All run, shown in the list
+    last_frames: IntProperty(default=0, options={'HIDDEN'})
+    last_cost_ms: FloatProperty(default=0.0, options={'HIDDEN'})
+
+# Make the selected armature target the one edited by the keyframe tools
+def activate_armature_target(self, context):
+    from . import utils
+    utils.activate_armature_target(context.scene, self.armature_target_index)
 
 # Function to jump to the selected frame in the timeline
 def jump_to_selected_frame(self, context):
@@ -43,11 +82,16 @@ def jump_to_selected_frame(self, context):
         # Set the current frame
         context.scene.frame_current = frame
 
+# Rebuild the keyframe list when the subframe settings change
+def refresh_keyframe_list(self, context):
+    from . import utils
+    utils.refresh_marked_keyframes(context.scene)
+
 # Define custom properties
 class CascadeurExportProperties(PropertyGroup):
     marked_keyframes: StringProperty(
         name="Marked Keyframes",
-        description="JSON representation of marked keyframes",
+        description="Marked keyframes as JSON (old format, migrated on load)",
         default="{}",
     )
     export_path: StringProperty(
@@ -73,6 +117,29 @@ class CascadeurExportProperties(PropertyGroup):
         default=True,
         options={'HIDDEN'}  # Ẩn khỏi UI
     )
+    refresh_interval: FloatProperty(
+        name="Refresh Interval",
+        description="Delay in seconds used to batch list/marker refreshes after marking keyframes",
+        default=0.05,
+        min=0.0,
+        max=2.0,
+        subtype='TIME_ABSOLUTE'
+    )
+    subframe_precision: BoolProperty(
+        name="Subframe Precision",
+        description="Round subframe keys to the nearest frame instead of truncating, and export their exact times",
+        default=False,
+        update=refresh_keyframe_list
+    )
+    subframe_tolerance: FloatProperty(
+        name="Subframe Tolerance",
+        description="Keys closer together than this (in frames) count as one key",
+        default=0.01,
+        min=0.0,
+        max=0.5,
+        precision=3,
+        update=refresh_keyframe_list
+    )
     keyframe_items: CollectionProperty(type=KeyframeListItem)
     keyframe_index: IntProperty(
         name="Selected Keyframe",
@@ -81,6 +148,39 @@ class CascadeurExportProperties(PropertyGroup):
         update=jump_to_selected_frame
     )
     list_filter: PointerProperty(type=KeyframeListFilter)
+    paginate_list: BoolProperty(
+        name="Paginate List",
+        description="Only create list items for one page of keyframes (for very long shots)",
+        default=False,
+        update=refresh_keyframe_list
+    )
+    list_page_size: IntProperty(
+        name="Page Size",
+        description="Number of keyframes per page in paginated mode",
+        default=200,
+        min=20,
+        max=5000,
+        update=refresh_keyframe_list
+    )
+    list_page: IntProperty(
+        name="Page",
+        description="Page of the keyframe list shown in paginated mode",
+        default=0,
+        min=0,
+        options={'HIDDEN'}
+    )
+    multi_armature: BoolProperty(
+        name="Multi-Armature Mode",
+        description="Mark and export several armatures, each with its own marked keyframes",
+        default=False
+    )
+    armature_targets: CollectionProperty(type=ArmatureTarget)
+    armature_target_index: IntProperty(
+        name="Active Armature Target",
+        description="Armature whose keyframes are shown and edited",
+        default=0,
+        update=activate_armature_target
+    )
     armature: PointerProperty(
         type=bpy.types.Object,
         name="Armature",
@@ -92,6 +192,7 @@ class CascadeurExportProperties(PropertyGroup):
 classes = (
     KeyframeListItem,
     KeyframeListFilter,
+    ArmatureTarget,
     CascadeurExportProperties,
 )
 
@@ -0,0 +1,119 @@
+import bpy
+from . import profiling
+
+# Debounced refresh of the keyframe list, timeline markers and panel stats.
+# Callers queue dirty flags per scene; one bpy.app.timers callback coalesces
+# them and runs each refresh at most once per interval.
+
+# What needs refreshing
+LIST = 'LIST'        # Full keyframe list update (frames may have changed)
+MARKS = 'MARKS'      # Only is_marked of the list items
+MARKERS = 'MARKERS'  # Timeline markers
+STATS = 'STATS'      # Panel counts/redraw
+STORE = 'STORE'      # Write the marked keyframe store back to the scene property
+
+# Default delay between the first request and the flush (seconds)
+DEFAULT_INTERVAL = 0.05
+
+# scene key -> set of pending flags
+_pending = {}
+
+# Helper function to get the interval configured on a scene
+def _scene_interval(scene):
+    settings = getattr(scene, "cascadeur_export", None)
+    return getattr(settings, "refresh_interval", DEFAULT_INTERVAL) if settings else DEFAULT_INTERVAL
+
+# Queue refreshes for a scene - they run together on the next flush
+def request(scene, *flags):
+    from . import utils
+    key = utils.scene_key(scene)
+    pending = _pending.setdefault(key, set())
+    pending.update(flags)
+
+    if bpy.app.background:
+        # No event loop to run timers, refresh right away
+        flush()
+    elif not bpy.app.timers.is_registered(_on_timer):
+        bpy.app.timers.register(_on_timer, first_interval=max(0.0, _scene_interval(scene)))
+
+# Check if a refresh is queued for a scene
+def is_pending(scene, flag=None):
+    from . import utils
+    pending = _pending.get(utils.scene_key(scene))
+    if not pending:
+        return False
+    return flag is None or flag in pending
+
+# Helper function to redraw the sidebar so new counts show up
+def tag_redraw():
+    window_manager = getattr(bpy.context, "window_manager", None)
+    if window_manager is None:
+        return
+    for window in window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+# Run every queued refresh now (optionally only for one scene)
+@profiling.profiled()
+def flush(scene=None):
+    from . import utils
+    if not _pending:
+        return
+
+    if scene is not None:
+        keys = [utils.scene_key(scene)]
+        scenes = {keys[0]: scene}
+    else:
+        keys = list(_pending)
+        scenes = {utils.scene_key(s): s for s in bpy.data.scenes}
+
+    redraw = False
+    for key in keys:
+        flags = _pending.pop(key, None)
+        target = scenes.get(key)
+        if not flags or target is None or not hasattr(target, "cascadeur_export"):
+            continue
+        profiling.add_items(len(flags))
+
+        try:
+            if STORE in flags:
+                utils.flush_marked_store(target)
+            # A full list update also refreshes the marks
+            if LIST in flags:
+                utils.update_keyframe_list(target)
+            elif MARKS in flags:
+                utils.update_keyframe_marks(target)
+            if MARKERS in flags and target.cascadeur_export.show_markers:
+                utils.update_timeline_markers(target)
+        except Exception as e:
+            print(f"Error refreshing scene {target.name}: {e}")
+        redraw = redraw or bool(flags - {STORE})
+
+    if redraw:
+        tag_redraw()
+
+# Timer callback - flush once, then stop until the next request
+def _on_timer():
+    flush()
+    return None
+
+# Drop everything queued (file load / unregister)
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def clear(*args):
+    _pending.clear()
+    if bpy.app.timers.is_registered(_on_timer):
+        bpy.app.timers.unregister(_on_timer)
+
+# Registration
+def register():
+    if clear not in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.append(clear)
+
+def unregister():
+    if clear in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(clear)
+    # Anything still queued is applied before the add-on goes away
+    flush()
+    clear()
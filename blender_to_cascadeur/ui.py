@@ -1,6 +1,70 @@
 import bpy
-from bpy.types import Panel
+import os
+from bpy.types import Panel, UIList
 from . import utils
+from . import profiling
+from . import metadata_writer
+from . import keyframe_scan
+
+# Các giá trị panel cần, chỉ tính lại khi dữ liệu nguồn thay đổi (không phải mỗi lần hover)
+class PanelViewModel:
+    def __init__(self):
+        self.counts_key = None
+        self.marked_count = 0
+        self.total_count = 0
+        self.armature_key = None
+        self.is_arp_armature = False
+        # None: chưa kiểm tra (hoặc cần kiểm tra lại)
+        self.arp_available = None
+
+# scene key -> PanelViewModel
+_view_models = {}
+
+# Số giây giữa các lần kiểm tra lại add-on Auto-Rig Pro (có thể được bật/tắt bất kỳ lúc nào)
+ARP_CHECK_INTERVAL = 5.0
+
+# Helper function to get the up-to-date view-model of a scene
+@profiling.profiled()
+def get_panel_view_model(scene):
+    key = utils.scene_key(scene)
+    view = _view_models.get(key)
+    if view is None:
+        view = _view_models[key] = PanelViewModel()
+    settings = scene.cascadeur_export
+    
+    # Số mục đã đánh dấu / tổng số - đổi khi danh sách hoặc store đổi
+    # Tính trên toàn bộ mảng frame, không chỉ trang đang hiển thị
+    items = settings.keyframe_items
+    store = utils.get_marked_store(scene)
+    counts_key = (utils.get_keyframe_list_version(scene), id(store), store.version, len(items))
+    if counts_key != view.counts_key:
+        view.marked_count, view.total_count = utils.get_keyframe_list_counts(scene)
+        view.counts_key = counts_key
+    
+    # Nhận diện Auto-Rig Pro - đổi khi chọn armature khác
+    armature = settings.armature
+    armature_key = (armature.as_pointer(), armature.name) if armature else None
+    if armature_key != view.armature_key:
+        view.is_arp_armature = utils.is_auto_rig_pro_armature(armature) if armature else False
+        view.armature_key = armature_key
+    
+    # Add-on Auto-Rig Pro - chỉ kiểm tra khi cờ bị xóa (nạp file, undo/redo hoặc bộ hẹn giờ)
+    if view.arp_available is None:
+        view.arp_available = utils.is_auto_rig_pro_available()
+    
+    return view
+
+# Xóa cache khi dữ liệu scene được nạp lại
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def clear_view_models(*args):
+    _view_models.clear()
+
+# Bộ hẹn giờ tần suất thấp - đánh dấu cần kiểm tra lại Auto-Rig Pro ở lần vẽ tiếp theo
+def _expire_arp_check():
+    for view in _view_models.values():
+        view.arp_available = None
+    return ARP_CHECK_INTERVAL
 
 # UI Panel
 class CASCADEUR_PT_export_panel(Panel):
@@ -14,6 +78,11 @@ class CASCADEUR_PT_export_panel(Panel):
         layout = self.layout
         scene = context.scene
         
+        # Scene mới (chưa được khởi tạo) - khởi tạo ở tick kế tiếp vì draw không được ghi dữ liệu
+        if not utils.is_scene_initialized(scene):
+            utils.request_scene_initialization(scene)
+        view = get_panel_view_model(scene)
+        
         # Phần chọn armature
         box = layout.box()
         box.label(text="Armature Selection")
@@ -24,7 +93,7 @@ class CASCADEUR_PT_export_panel(Panel):
             row.operator("cascadeur.clear_armature", text="", icon='X')
             
             # Hiển thị nếu đó là armature Auto-Rig Pro
-            if utils.is_auto_rig_pro_armature(scene.cascadeur_export.armature):
+            if view.is_arp_armature:
                 box.label(text="Auto-Rig Pro: Detected", icon='CHECKMARK')
             else:
                 box.label(text="Auto-Rig Pro: Not detected", icon='ERROR')
@@ -33,6 +102,21 @@ class CASCADEUR_PT_export_panel(Panel):
         
         box.operator("cascadeur.select_armature", icon='EYEDROPPER')
         
+        # Chế độ nhiều armature: đánh dấu và xuất nhiều nhân vật cùng lúc
+        box.prop(scene.cascadeur_export, "multi_armature")
+        if scene.cascadeur_export.multi_armature:
+            row = box.row()
+            row.template_list("CASCADEUR_UL_armature_targets", "", scene.cascadeur_export, "armature_targets",
+                              scene.cascadeur_export, "armature_target_index", rows=3)
+            col = row.column(align=True)
+            col.operator("cascadeur.add_armature_targets", text="", icon='ADD')
+            col.operator("cascadeur.remove_armature_target", text="", icon='REMOVE')
+            
+            row = box.row()
+            row.operator("cascadeur.mark_all_targets", icon='KEYFRAME_HLT')
+            row.operator("cascadeur.clear_all_targets", icon='X')
+            box.operator("cascadeur.export_all_targets", icon='EXPORT')
+        
         # Phần đánh dấu keyframe
         box = layout.box()
         box.label(text="Keyframe Markers")
@@ -46,6 +130,7 @@ class CASCADEUR_PT_export_panel(Panel):
         row = box.row()
         row.operator("cascadeur.mark_all_keyframes", icon='KEYFRAME_HLT')
         row.operator("cascadeur.clear_all_keyframes", icon='X')
+        box.operator("cascadeur.detect_key_poses", icon='POSE_HLT')
         
         # Bật/tắt timeline markers
         row = box.row()
@@ -53,6 +138,13 @@ class CASCADEUR_PT_export_panel(Panel):
         marker_text = "Hide Timeline Markers" if scene.cascadeur_export.show_markers else "Show Timeline Markers"
         row.operator("cascadeur.toggle_markers", text=marker_text, icon=icon)
         
+        # Chế độ subframe (làm tròn key lệch frame, xuất thời gian chính xác)
+        row = box.row(align=True)
+        row.prop(scene.cascadeur_export, "subframe_precision")
+        sub = row.row(align=True)
+        sub.active = scene.cascadeur_export.subframe_precision
+        sub.prop(scene.cascadeur_export, "subframe_tolerance", text="Tolerance")
+        
         # Danh sách keyframe
         box = layout.box()
         box.label(text="Marked Keyframes")
@@ -65,15 +157,34 @@ class CASCADEUR_PT_export_panel(Panel):
         
         # Dòng thông tin với tổng số và nút làm mới
         row = box.row()
-        # Đếm an toàn các mục đã đánh dấu
-        marked_count = 0
-        for item in scene.cascadeur_export.keyframe_items:
-            if item.is_marked:
-                marked_count += 1
-        total_count = len(scene.cascadeur_export.keyframe_items)
-        row.label(text=f"Marked: {marked_count} / Total: {total_count}")
+        row.label(text=f"Marked: {view.marked_count} / Total: {view.total_count}")
         row.operator("cascadeur.refresh_keyframe_list", text="", icon='FILE_REFRESH')
         
+        # Tiến trình quét keyframe của cả scene (chạy theo từng phần trên timer)
+        scan = keyframe_scan.get_scan(scene)
+        if scan is not None:
+            row = box.row()
+            row.label(text=f"Scanning objects: {scan.progress * 100.0:.0f}% ({scan.done}/{scan.total})", icon='TIME')
+            row.operator("cascadeur.cancel_keyframe_scan", text="", icon='CANCEL')
+        
+        # Điều khiển trang trong chế độ phân trang (chỉ một trang được tạo thành mục danh sách)
+        row = box.row(align=True)
+        row.prop(scene.cascadeur_export, "paginate_list")
+        if scene.cascadeur_export.paginate_list:
+            row.prop(scene.cascadeur_export, "list_page_size", text="Size")
+            page_info = utils.get_keyframe_page_info(scene)
+            if page_info is not None:
+                page, page_count, matching = page_info
+                row = box.row(align=True)
+                row.operator("cascadeur.keyframe_list_page", text="", icon='REW').action = 'FIRST'
+                row.operator("cascadeur.keyframe_list_page", text="", icon='TRIA_LEFT').action = 'PREVIOUS'
+                row.label(text=f"Page {page + 1} / {page_count} ({matching} keys)")
+                row.operator("cascadeur.keyframe_list_page", text="", icon='TRIA_RIGHT').action = 'NEXT'
+                row.operator("cascadeur.keyframe_list_page", text="", icon='FF').action = 'LAST'
+                row = box.row(align=True)
+                row.operator("cascadeur.keyframe_list_jump", text="Current Frame", icon='TIME')
+                row.operator("cascadeur.keyframe_list_jump", text="Go to Frame...", icon='VIEWZOOM').use_current_frame = False
+        
         # Sử dụng template_list với lớp UIList cơ bản
         try:
             row = box.row()
@@ -92,17 +203,100 @@ class CASCADEUR_PT_export_panel(Panel):
         
         # Nút xuất đơn
         box.operator("cascadeur.export_unified", icon='EXPORT')
+        box.operator("cascadeur.export_pose_snapshot", icon='ARMATURE_DATA')
+        
+        # Tiến trình ghi metadata ở luồng nền
+        for job in metadata_writer.active_jobs():
+            box.label(text=f"Writing {os.path.basename(job.filepath)}: {job.progress * 100.0:.0f}%", icon='TIME')
+        if not view.arp_available:
+            box.label(text="Auto-Rig Pro add-on not found", icon='INFO')
+
+# Sub-panel hiển thị số liệu profiling
+class CASCADEUR_PT_profiling_panel(Panel):
+    bl_label = "Profiling"
+    bl_idname = "CASCADEUR_PT_profiling_panel"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "BtC"
+    bl_parent_id = "CASCADEUR_PT_export_panel"
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    # Số dòng tối đa hiển thị trong bảng
+    max_rows = 15
+    
+    def draw(self, context):
+        layout = self.layout
+        
+        # Nút bật/tắt, xóa và lưu
+        row = layout.row(align=True)
+        enabled = profiling.is_enabled()
+        row.operator("cascadeur.toggle_profiling",
+                     text="Stop Recording" if enabled else "Start Recording",
+                     icon='PAUSE' if enabled else 'REC')
+        row.operator("cascadeur.reset_profiling", text="", icon='TRASH')
+        row.operator("cascadeur.dump_profiling", text="", icon='EXPORT')
+        
+        report = profiling.get_report()
+        if not report:
+            layout.label(text="No timings recorded yet")
+            return
+        
+        # Bảng: tên, số lần gọi, p50/p95/max (ms), số mục đã xử lý
+        box = layout.box()
+        col = box.column(align=True)
+        header = col.row()
+        header.label(text="Name")
+        header.label(text="Calls")
+        header.label(text="p50/p95/max ms")
+        header.label(text="Items")
+        for entry in report[:self.max_rows]:
+            row = col.row()
+            row.label(text=entry["name"].split(".", 1)[-1] if entry["name"].startswith("utils.") else entry["name"])
+            row.label(text=str(entry["count"]))
+            row.label(text=f"{entry['p50_ms']:.2f}/{entry['p95_ms']:.2f}/{entry['max_ms']:.2f}")
+            row.label(text=str(entry["items"]))
+        if len(report) > self.max_rows:
+            box.label(text=f"... {len(report) - self.max_rows} more (save to see all)")
+
+# Danh sách armature trong chế độ nhiều armature
+class CASCADEUR_UL_armature_targets(UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, "enabled", text="")
+        name = item.armature.name if item.armature else "(missing)"
+        row.label(text=name, icon='ARMATURE_DATA' if item.is_active else 'OUTLINER_OB_ARMATURE')
+        # Số keyframe và thời gian của lần đánh dấu/xuất gần nhất
+        if item.last_frames or item.last_cost_ms:
+            row.label(text=f"{item.last_frames} keys, {item.last_cost_ms:.1f} ms")
 
 # Đăng ký
 classes = (
+    CASCADEUR_UL_armature_targets,
     CASCADEUR_PT_export_panel,
+    CASCADEUR_PT_profiling_panel,
 )
 
 def register():
+    # Đo thời gian vẽ panel chính khi profiling được bật
+    profiling.instrument_class(CASCADEUR_PT_export_panel, ("draw",))
+    
     for cls in classes:
         bpy.utils.register_class(cls)
+    
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if clear_view_models not in handlers:
+            handlers.append(clear_view_models)
+    if not bpy.app.timers.is_registered(_expire_arp_check):
+        bpy.app.timers.register(_expire_arp_check, first_interval=ARP_CHECK_INTERVAL, persistent=True)
 
 def unregister():
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if clear_view_models in handlers:
+            handlers.remove(clear_view_models)
+    if bpy.app.timers.is_registered(_expire_arp_check):
+        bpy.app.timers.unregister(_expire_arp_check)
+    clear_view_models()
+    
     for cls in reversed(classes):
         try:
             bpy.utils.unregister_class(cls)
@@ -1,8 +1,17 @@
 import bpy
-import json
 import os
+from array import array
+from bisect import bisect_left
+from . import keyframe_index
+from . import profiling
+from . import refresh_scheduler
+from . import metadata_writer
+from . import keyframe_scan
+from . import keyframe_store
+from .keyframe_store import MarkedKeyframeStore
 
 # Helper function to check if Auto-Rig Pro is available
+@profiling.profiled()
 def is_auto_rig_pro_available():
     # Check method 1: Check for 'arp' in operators
     if hasattr(bpy.ops, 'arp') or hasattr(bpy.ops, 'arp_export_scene'):
@@ -17,6 +26,7 @@ def is_auto_rig_pro_available():
     return False
 
 # Helper function to check if an armature is an Auto-Rig Pro rig
+@profiling.profiled()
 def is_auto_rig_pro_armature(armature):
     if not armature or armature.type != 'ARMATURE':
         return False
@@ -39,179 +49,664 @@ def is_auto_rig_pro_armature(armature):
     
     return False
 
+# Helper function to get a key that identifies a scene for this session
+def scene_key(scene):
+    return getattr(scene, "session_uid", None) or scene.as_pointer()
+
+# In-memory marked keyframe stores, one per scene
+_marked_stores = {}
+
+# Helper function to get the marked keyframe store of a scene, loading it on first use
+@profiling.profiled()
+def get_marked_store(scene):
+    key = scene_key(scene)
+    store = _marked_stores.get(key)
+    if store is None:
+        try:
+            store = MarkedKeyframeStore.from_id_properties(scene.cascadeur_export)
+        except (TypeError, ValueError, AttributeError) as e:
+            print(f"Error loading marked keyframes: {e}")
+            store = MarkedKeyframeStore()
+        _marked_stores[key] = store
+    return store
+
+# Helper function to write a dirty store back to the scene property
+@profiling.profiled()
+def flush_marked_store(scene):
+    store = _marked_stores.get(scene_key(scene))
+    if store is None or not store.dirty:
+        return False
+    try:
+        store.write_id_properties(scene.cascadeur_export)
+        store.dirty = False
+        return True
+    except Exception as e:
+        print(f"Error saving marked keyframes: {e}")
+        return False
+
+# Convert marks saved as JSON (older versions) to the int array format, for the scene and its targets
+# Returns the number of property groups converted.
+@profiling.profiled()
+def migrate_marked_keyframes(scene):
+    settings = scene.cascadeur_export
+    migrated = 0
+    for owner in [settings] + list(settings.armature_targets):
+        if not MarkedKeyframeStore.needs_migration(owner):
+            continue
+        try:
+            store = MarkedKeyframeStore.from_json(owner.marked_keyframes)
+        except (TypeError, ValueError) as e:
+            print(f"Error migrating marked keyframes of {scene.name}: {e}")
+            continue
+        store.write_id_properties(owner)
+        profiling.add_items(len(store))
+        migrated += 1
+    if migrated:
+        print(f"Migrated marked keyframes of {scene.name} to format {keyframe_store.STORAGE_VERSION}")
+    return migrated
+
+# Flush every dirty store - used on save and when unregistering
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def flush_all_marked_stores(*args):
+    for scene in bpy.data.scenes:
+        if hasattr(scene, "cascadeur_export"):
+            flush_marked_store(scene)
+    return None
+
+# Helper function to write the store back once the current burst of edits is over
+def schedule_marked_store_flush(scene):
+    refresh_scheduler.request(scene, refresh_scheduler.STORE)
+
+# Load/undo handler - the scene properties are the source of truth again
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def reset_marked_stores(*args):
+    _marked_stores.clear()
+
 # Helper function to safely get marked keyframes
+@profiling.profiled()
 def get_marked_keyframes(scene):
     try:
         if hasattr(scene, "cascadeur_export"):
-            marked_keyframes_str = scene.cascadeur_export.marked_keyframes
-            if isinstance(marked_keyframes_str, str) and marked_keyframes_str.strip():
-                return json.loads(marked_keyframes_str)
-    except (TypeError, json.JSONDecodeError, AttributeError) as e:
+            return get_marked_store(scene).to_dict()
+    except Exception as e:
         print(f"Error loading marked keyframes: {e}")
     
     # Return empty dict if anything goes wrong
     return {}
 
+# Helper function to refresh the list and markers after the marked set changed
+# The work is queued on the refresh scheduler, so a burst of changes costs one refresh.
+@profiling.profiled()
+def refresh_marked_keyframes(scene, preserve_ui_items=False):
+    # Update UI list - handle preserve_ui_items flag
+    list_flag = refresh_scheduler.MARKS if preserve_ui_items else refresh_scheduler.LIST
+    refresh_scheduler.request(scene, list_flag, refresh_scheduler.MARKERS, refresh_scheduler.STATS)
+
 # Helper function to safely set marked keyframes
+@profiling.profiled()
 def set_marked_keyframes(scene, keyframes_dict, preserve_ui_items=False):
     try:
         if hasattr(scene, "cascadeur_export"):
-            # Convert to JSON string
-            json_str = json.dumps(keyframes_dict)
-            # Set the property
-            scene.cascadeur_export.marked_keyframes = json_str
+            profiling.add_items(len(keyframes_dict))
+            store = get_marked_store(scene)
+            store.bulk_update(replace=keyframes_dict.keys())
+            for frame_str, data in keyframes_dict.items():
+                if data:
+                    store.add(int(frame_str), data)
+            schedule_marked_store_flush(scene)
             
-            # Update UI list - handle preserve_ui_items flag
-            if preserve_ui_items:
-                # Only update marks without clearing the list
-                update_keyframe_marks(scene)
-            else:
-                # Full update of the list
-                update_keyframe_list(scene)
-                
-            # Update timeline markers if enabled
-            if scene.cascadeur_export.show_markers:
-                update_timeline_markers(scene)
+            refresh_marked_keyframes(scene, preserve_ui_items)
             return True
     except Exception as e:
         print(f"Error saving marked keyframes: {e}")
         return False
 
-# Helper function to update timeline markers
+# Helper function to find the armature target whose marks are loaded in the scene store
+def get_active_armature_target(scene):
+    for target in scene.cascadeur_export.armature_targets:
+        if target.is_active:
+            return target
+    return None
+
+# Helper function to get the marked keyframes of an armature target
+# The active target is edited through the scene store; other targets are read from their property.
+def get_target_store(scene, target):
+    if target.is_active:
+        return get_marked_store(scene)
+    try:
+        return MarkedKeyframeStore.from_id_properties(target)
+    except (TypeError, ValueError) as e:
+        print(f"Error loading marked keyframes of {target.name}: {e}")
+        return MarkedKeyframeStore()
+
+# Helper function to save the marked keyframes of an armature target after a change
+def save_target_store(scene, target, store):
+    if target.is_active:
+        schedule_marked_store_flush(scene)
+        refresh_marked_keyframes(scene)
+    else:
+        store.write_id_properties(target)
+
+# Make an armature target the one edited by the keyframe tools
+# The marks of the previous target are saved to it and the new target's marks are loaded.
+@profiling.profiled()
+def activate_armature_target(scene, index):
+    settings = scene.cascadeur_export
+    targets = settings.armature_targets
+    if not 0 <= index < len(targets):
+        return
+    target = targets[index]
+    previous = get_active_armature_target(scene)
+    if previous is not None and previous == target:
+        return
+    
+    store = get_marked_store(scene)
+    if previous is not None:
+        store.write_id_properties(previous)
+        previous.is_active = False
+    
+    new_store = MarkedKeyframeStore.from_id_properties(target)
+    store.clear()
+    store.bulk_update(add=new_store.frames, metadata=new_store.metadata)
+    target.is_active = True
+    settings.armature = target.armature
+    # Written right away: the undo step of the selection change is pushed after this returns
+    flush_marked_store(scene)
+    refresh_marked_keyframes(scene)
+
+# Helper function to export an FBX of one armature and its children with Blender's FBX exporter
+# Returns the path written, or None when the FBX exporter is not available.
+@profiling.profiled()
+def export_armature_fbx(scene, armature, filepath):
+    if not hasattr(bpy.ops, "export_scene") or not hasattr(bpy.ops.export_scene, "fbx"):
+        return None
+
+    # The view layer the user works in (batch runs over other scenes use their first one)
+    view_layer = bpy.context.view_layer
+    if view_layer is None or bpy.context.scene != scene:
+        view_layer = scene.view_layers[0]
+
+    # Remember the user's selection, it is put back once the export is done
+    selected = [obj for obj in view_layer.objects if obj.select_get(view_layer=view_layer)]
+    active = view_layer.objects.active
+    try:
+        for obj in view_layer.objects:
+            obj.select_set(False, view_layer=view_layer)
+        armature.select_set(True, view_layer=view_layer)
+        for child in armature.children_recursive:
+            if child.name in view_layer.objects:
+                child.select_set(True, view_layer=view_layer)
+
+        fbx_options = dict(
+            filepath=filepath,
+            use_selection=True,
+            object_types={'ARMATURE', 'MESH'},
+            bake_anim=True,
+            add_leaf_bones=False,
+        )
+        if hasattr(bpy.context, "temp_override"):
+            with bpy.context.temp_override(scene=scene, view_layer=view_layer, active_object=armature):
+                bpy.ops.export_scene.fbx(**fbx_options)
+        else:
+            view_layer.objects.active = armature
+            bpy.ops.export_scene.fbx(**fbx_options)
+    finally:
+        for obj in view_layer.objects:
+            obj.select_set(False, view_layer=view_layer)
+        for obj in selected:
+            try:
+                obj.select_set(True, view_layer=view_layer)
+            except ReferenceError:
+                pass
+        view_layer.objects.active = active
+    return filepath
+
+# Helper function to make a string safe to use in a file name
+def safe_file_name(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+# Prefix used for the timeline markers this add-on owns
+MARKER_PREFIX = "Key:"
+
+# Marker sync state per scene: the marked data last synced and a frame -> marker name map
+_marker_sync = {}
+
+# Helper function to update timeline markers - only adds/removes the markers that differ
+@profiling.profiled()
 def update_timeline_markers(scene):
     try:
         # Get marked keyframes
-        marked_keyframes = get_marked_keyframes(scene)
+        store = get_marked_store(scene)
+        source = (id(store), store.version)
+        marked_frames = set(store.frames)
+        
+        timeline_markers = scene.timeline_markers
+        key = scene_key(scene)
+        state = _marker_sync.get(key)
         
-        # First clear existing cascadeur markers
-        for marker in list(scene.timeline_markers):
-            if marker.name.startswith("Key:"):
-                scene.timeline_markers.remove(marker)
+        # First sync for this scene: adopt the Key: markers that already exist
+        if state is None:
+            markers = {}
+            for marker in list(timeline_markers):
+                if marker.name.startswith(MARKER_PREFIX):
+                    if marker.frame in markers:
+                        # Drop duplicates left over from older versions
+                        timeline_markers.remove(marker)
+                    else:
+                        markers[marker.frame] = marker.name
+            state = {"source": None, "markers": markers}
+            _marker_sync[key] = state
         
-        # Create new markers for each keyframe
-        for frame_str in marked_keyframes.keys():
+        markers = state["markers"]
+        
+        # Forget markers the user deleted, so marked frames get theirs back
+        existing = {marker.name for marker in timeline_markers}
+        for frame in [f for f, name in markers.items() if name not in existing]:
+            del markers[frame]
+        
+        # Remove markers for frames that are no longer marked
+        removed = [f for f in markers if f not in marked_frames]
+        added = sorted(marked_frames.difference(markers))
+        profiling.add_items(len(removed) + len(added))
+        for frame in removed:
+            marker = timeline_markers.get(markers.pop(frame))
+            if marker is not None:
+                timeline_markers.remove(marker)
+        
+        # Create markers only for newly marked frames
+        for frame in added:
             try:
-                frame = int(frame_str)
                 # Create marker with frame number as name
-                marker = scene.timeline_markers.new(f"Key:{frame}", frame=frame)
-                # Set marker color (green)
-                marker.color = (0.2, 0.8, 0.2)
+                marker = timeline_markers.new(f"{MARKER_PREFIX}{frame}", frame=frame)
+                # Set marker color (green) where supported
+                if hasattr(marker, "color"):
+                    marker.color = (0.2, 0.8, 0.2)
+                markers[frame] = marker.name
             except Exception as e:
-                print(f"Error creating marker for frame {frame_str}: {e}")
+                print(f"Error creating marker for frame {frame}: {e}")
         
+        state["source"] = source
         return True
     except Exception as e:
         print(f"Error updating timeline markers: {e}")
         return False
 
+# Helper function to remove all of our timeline markers from a scene
+@profiling.profiled()
+def clear_timeline_markers(scene):
+    for marker in list(scene.timeline_markers):
+        if marker.name.startswith(MARKER_PREFIX):
+            scene.timeline_markers.remove(marker)
+    _marker_sync.pop(scene_key(scene), None)
+
+# Helper function to check if the markers already match the marked keyframes
+@profiling.profiled()
+def timeline_markers_in_sync(scene):
+    state = _marker_sync.get(scene_key(scene))
+    if state is None:
+        return False
+    store = get_marked_store(scene)
+    return state["source"] == (id(store), store.version)
+
+# Version counter of the keyframe list contents per scene (frames and marks)
+_keyframe_list_versions = {}
+
+# Helper function to get the current keyframe list version of a scene
+def get_keyframe_list_version(scene):
+    return _keyframe_list_versions.get(scene_key(scene), 0)
+
+# Helper function to note that the keyframe list items changed
+def bump_keyframe_list_version(scene):
+    key = scene_key(scene)
+    _keyframe_list_versions[key] = _keyframe_list_versions.get(key, 0) + 1
+
+# Helper function to forget the list versions (the items were restored from undo/file data)
+def reset_keyframe_list_versions():
+    _keyframe_list_versions.clear()
+
+# Helper function to read the frame of every list item in one call
+@profiling.profiled()
+def get_keyframe_item_frames(items):
+    frames = [0] * len(items)
+    items.foreach_get("frame", frames)
+    return frames
+
+# Helper function to write is_marked for every list item, only if something changed
+def _sync_item_marks(items, frames, store):
+    marks = [store.contains(frame) for frame in frames]
+    current = [False] * len(items)
+    items.foreach_get("is_marked", current)
+    if marks != current:
+        items.foreach_set("is_marked", marks)
+        return True
+    return False
+
 # Helper function to update only the marks in the keyframe list
+@profiling.profiled()
 def update_keyframe_marks(scene):
     try:
         # Get marked keyframes
-        marked_keyframes = get_marked_keyframes(scene)
-        marked_frames = set(int(f) for f in marked_keyframes.keys())
+        store = get_marked_store(scene)
+        
+        # The page content depends on the marks when filtering by state
+        settings = scene.cascadeur_export
+        if settings.paginate_list and settings.list_filter.filter_state != 'ALL':
+            return update_keyframe_page(scene)
         
         # Update each item in the list
-        for item in scene.cascadeur_export.keyframe_items:
-            item.is_marked = item.frame in marked_frames
+        items = scene.cascadeur_export.keyframe_items
+        if _sync_item_marks(items, get_keyframe_item_frames(items), store):
+            bump_keyframe_list_version(scene)
             
         return True
     except Exception as e:
         print(f"Error updating keyframe marks: {e}")
         return False
 
+# Helper function to merge a sorted frame list into the keyframe items
+# Only the difference is removed/added; surviving items are kept as they are.
+# Returns True if anything in the list changed.
+@profiling.profiled()
+def sync_keyframe_items(items, frames, store):
+    old_frames = get_keyframe_item_frames(items)
+    frames_changed = old_frames != frames
+    
+    if frames_changed:
+        new_set = set(frames)
+        kept = [f for f in old_frames if f in new_set]
+        
+        if len(kept) * 2 < len(old_frames):
+            # Most items are gone (e.g. another page) - rebuilding beats removing one by one
+            items.clear()
+            for _ in range(len(frames)):
+                items.add()
+            items.foreach_set("frame", frames)
+        else:
+            # Remove items whose frame is gone (back to front so indices stay valid)
+            for i in range(len(old_frames) - 1, -1, -1):
+                if old_frames[i] not in new_set:
+                    items.remove(i)
+            
+            if any(a > b for a, b in zip(kept, kept[1:])):
+                # List was not sorted (older versions) - resize and rewrite in place
+                for _ in range(len(frames) - len(kept)):
+                    items.add()
+                items.foreach_set("frame", frames)
+            else:
+                # Merge walk: insert each new frame at its sorted position
+                kept_set = set(kept)
+                position = 0
+                for frame in frames:
+                    if frame not in kept_set:
+                        item = items.add()
+                        item.frame = frame
+                        last = len(items) - 1
+                        if position != last:
+                            items.move(last, position)
+                    position += 1
+    
+    # Update marks in place
+    marks_changed = _sync_item_marks(items, frames, store)
+    return frames_changed or marks_changed
+
 # Helper function to update the keyframe list UI
+# Without an armature every animated object is scanned; that scan runs in
+# time-budgeted chunks on a timer (see keyframe_scan) and fills the list as it goes.
+@profiling.profiled()
 def update_keyframe_list(scene):
     try:
         # Get list of all keyframes in the scene/armature
         armature = scene.cascadeur_export.armature
-        all_keyframes = find_all_keyframes(bpy.context, armature)
+        if not (armature and keyframe_index.has_animation(armature.animation_data)):
+            keyframe_scan.start_scan(scene, get_subframe_tolerance(scene))
+            return True
         
-        # Get marked keyframes
-        marked_keyframes = get_marked_keyframes(scene)
-        marked_frames = set(int(f) for f in marked_keyframes.keys())
+        # A scan of the whole scene started earlier is not wanted anymore
+        keyframe_scan.cancel_scan(scene)
+        return apply_keyframe_list(scene, find_all_keyframes(bpy.context, armature))
+    except Exception as e:
+        print(f"Error updating keyframe list: {e}")
+        return False
+
+# Helper function to show a sorted frame list in the keyframe list UI
+# The full frame list is kept in a compact array; in paginated mode only one page
+# of it is turned into list items.
+@profiling.profiled()
+def apply_keyframe_list(scene, all_keyframes):
+    try:
+        key = scene_key(scene)
+        frames = array('i', all_keyframes)
+        profiling.add_items(len(frames))
+        if _keyframe_list_frames.get(key) != frames:
+            _keyframe_list_frames[key] = frames
+            bump_keyframe_list_version(scene)
         
-        # Store current index to restore later
-        current_index = scene.cascadeur_export.keyframe_index
+        if scene.cascadeur_export.paginate_list:
+            return update_keyframe_page(scene)
+        _keyframe_list_pages.pop(key, None)
+        return _sync_list_items(scene, all_keyframes)
+    except Exception as e:
+        print(f"Error updating keyframe list: {e}")
+        return False
+
+# Helper function to put a sorted frame list into the list items and keep the selection
+# select_frame: frame to select (the nearest following one if it is not in the list)
+def _sync_list_items(scene, frames, select_frame=None):
+    # Get marked keyframes
+    store = get_marked_store(scene)
+    
+    items = scene.cascadeur_export.keyframe_items
+    
+    # Store current index to restore later
+    current_index = scene.cascadeur_export.keyframe_index
+    
+    # Remember the frame of the current selected item (if any)
+    current_frame = select_frame
+    if current_frame is None and 0 <= current_index < len(items):
+        current_frame = items[current_index].frame
+    
+    # Merge the new frames into the existing items
+    if sync_keyframe_items(items, frames, store):
+        bump_keyframe_list_version(scene)
+    
+    # Try to restore selection to the same (or nearest following) frame or keep the index
+    if not frames:
+        new_index = 0
+    elif current_frame is not None:
+        new_index = min(bisect_left(frames, current_frame), len(frames) - 1)
+    else:
+        # Just keep the same index if possible
+        new_index = max(0, min(current_index, len(frames) - 1))
         
-        # Remember the frame of the current selected item (if any)
-        current_frame = -1
-        if 0 <= current_index < len(scene.cascadeur_export.keyframe_items):
-            current_frame = scene.cascadeur_export.keyframe_items[current_index].frame
+    # Set without triggering the update callback
+    scene.cascadeur_export["keyframe_index"] = new_index
         
-        # Clear existing items
-        scene.cascadeur_export.keyframe_items.clear()
+    return True
+
+# Full (unpaged, unfiltered) frame list of the keyframe list per scene, array('i')
+_keyframe_list_frames = {}
+
+# Paging state per scene: (page, page count, frames matching the filter)
+_keyframe_list_pages = {}
+
+# Helper function to get every frame of the keyframe list (not only the materialized page)
+def get_keyframe_list_frames(scene):
+    frames = _keyframe_list_frames.get(scene_key(scene))
+    if frames is None:
+        # List filled before this session (e.g. saved in the file)
+        frames = array('i', get_keyframe_item_frames(scene.cascadeur_export.keyframe_items))
+    return frames
+
+# Helper function to get (marked, total) for the whole keyframe list
+@profiling.profiled()
+def get_keyframe_list_counts(scene):
+    frames = get_keyframe_list_frames(scene)
+    store = get_marked_store(scene)
+    # Walk the smaller sorted array, binary search the other
+    small, large = (store.frames, frames) if len(store) < len(frames) else (frames, store.frames)
+    marked = 0
+    size = len(large)
+    for frame in small:
+        i = bisect_left(large, frame)
+        if i < size and large[i] == frame:
+            marked += 1
+    profiling.add_items(len(small))
+    return marked, len(frames)
+
+# Helper function to get (page, page count, matching frames) of a paginated list, None otherwise
+def get_keyframe_page_info(scene):
+    return _keyframe_list_pages.get(scene_key(scene))
+
+# Helper function to apply the list filter to the full frame list (paginated mode)
+# Same matching as the UIList: frame number prefix and marked state.
+def _filter_list_frames(scene, frames):
+    list_filter = scene.cascadeur_export.list_filter
+    name = list_filter.filter_string.lower()
+    state = list_filter.filter_state
+    if not name and state == 'ALL':
+        return frames
+    store = get_marked_store(scene)
+    marked = state == 'MARKED'
+    return array('i', (frame for frame in frames
+                       if (not name or str(frame).startswith(name))
+                       and (state == 'ALL' or store.contains(frame) == marked)))
+
+# Materialize one page of the keyframe list (paginated mode)
+# page: page to show (default: the current one); select_frame: show the page holding
+# this frame (or the nearest following one) and select it.
+@profiling.profiled()
+def update_keyframe_page(scene, page=None, select_frame=None):
+    try:
+        settings = scene.cascadeur_export
+        frames = _filter_list_frames(scene, get_keyframe_list_frames(scene))
+        size = max(1, settings.list_page_size)
+        page_count = max(1, -(-len(frames) // size))
         
-        # Add each keyframe to the list
-        for frame in all_keyframes:
-            item = scene.cascadeur_export.keyframe_items.add()
-            item.frame = frame
-            item.is_marked = frame in marked_frames
+        if select_frame is not None:
+            page = min(bisect_left(frames, select_frame), max(0, len(frames) - 1)) // size
+        elif page is None:
+            page = settings.list_page
+        page = max(0, min(page, page_count - 1))
+        window = frames[page * size:(page + 1) * size].tolist()
+        if page != settings.list_page:
+            # Another page - select its first item unless a frame is given
+            settings["list_page"] = page
+            if select_frame is None and window:
+                select_frame = window[0]
         
-        # Try to restore selection to the same frame or keep the index
-        new_index = 0
-        if current_frame >= 0:
-            # Try to find the same frame
-            for i, item in enumerate(scene.cascadeur_export.keyframe_items):
-                if item.frame == current_frame:
-                    new_index = i
-                    break
-        else:
-            # Just keep the same index if possible
-            new_index = min(current_index, len(scene.cascadeur_export.keyframe_items) - 1) if scene.cascadeur_export.keyframe_items else 0
-            
-        # Set without triggering the update callback
-        scene.cascadeur_export["keyframe_index"] = new_index
-            
-        return True
+        _keyframe_list_pages[scene_key(scene)] = (page, page_count, len(frames))
+        profiling.add_items(len(window))
+        return _sync_list_items(scene, window, select_frame)
     except Exception as e:
-        print(f"Error updating keyframe list: {e}")
+        print(f"Error updating keyframe page: {e}")
         return False
 
+# Helper function to add the .json extension and create the directory of a metadata path
+def _prepare_metadata_path(filepath):
+    # Add .json extension if missing
+    if not filepath.lower().endswith('.json'):
+        filepath += '.json'
+    
+    # Create the directory if it doesn't exist
+    directory = os.path.dirname(filepath)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    return filepath
+
+# Helper function to write the keyframe metadata JSON, returns the path written
+# The file is streamed to a temp file and renamed into place, so it is never left half written.
+@profiling.profiled()
+def write_keyframe_metadata(filepath, marked_keyframes):
+    return metadata_writer.write_json(_prepare_metadata_path(filepath), marked_keyframes)
+
+# Helper function to write the keyframe metadata JSON on a background thread, returns the job
+# on_done(job) is called on the main thread when the write has finished.
+def write_keyframe_metadata_async(filepath, marked_keyframes, on_done=None):
+    return metadata_writer.start_write(_prepare_metadata_path(filepath), marked_keyframes, on_done=on_done)
+
+# Helper function to get the subframe tolerance of a scene, None when precision mode is off
+def get_subframe_tolerance(scene):
+    settings = getattr(scene, "cascadeur_export", None)
+    if settings is None or not settings.subframe_precision:
+        return None
+    return settings.subframe_tolerance
+
+# Helper function to find the exact key times in the scene, {frame: time}
+# Used by the subframe precision mode; frames are rounded to the nearest whole frame.
+@profiling.profiled()
+def find_keyframe_times(context, armature=None, tolerance=0.01):
+    try:
+        if armature and keyframe_index.has_animation(armature.animation_data):
+            frame_times = keyframe_index.get_animation_frame_times(armature, tolerance)
+            profiling.add_items(len(frame_times))
+            return frame_times
+        
+        # Merge all objects, keeping the time closest to each frame
+        frame_times = {}
+        for _ in keyframe_scan.iter_scene_keyframes(context.scene.objects, None, frame_times, tolerance):
+            pass
+        profiling.add_items(len(frame_times))
+        return frame_times
+    except Exception as e:
+        print(f"Error finding keyframe times: {e}")
+        return {}
+
+# Helper function to get the metadata stored with a newly marked frame (exact time in precision mode)
+def get_mark_metadata(scene, frame):
+    tolerance = get_subframe_tolerance(scene)
+    if tolerance is None:
+        return None
+    time = find_keyframe_times(bpy.context, scene.cascadeur_export.armature, tolerance).get(frame)
+    return {"time": time} if time is not None else None
+
 # Helper function to find all keyframes in the scene
+@profiling.profiled()
 def find_all_keyframes(context, armature=None):
     keyframes = set()
     
+    # Subframe precision mode - rounded frames from the exact key times
+    tolerance = get_subframe_tolerance(context.scene)
+    if tolerance is not None:
+        keyframes = sorted(find_keyframe_times(context, armature, tolerance))
+        profiling.add_items(len(keyframes))
+        return keyframes
+    
     try:
         # If armature is specified, only check that armature
-        if armature and armature.animation_data and armature.animation_data.action:
-            for fcurve in armature.animation_data.action.fcurves:
-                for keyframe in fcurve.keyframe_points:
-                    # Make sure we're extracting an integer value
-                    frame_value = int(keyframe.co[0])
-                    keyframes.add(frame_value)
-            return sorted(list(keyframes))
+        # NLA strips are mapped to scene time, plain actions come straight from the index
+        if armature and keyframe_index.has_animation(armature.animation_data):
+            keyframes = list(keyframe_index.get_animation_frames(armature))
+            profiling.add_items(len(keyframes))
+            return keyframes
         
         # Otherwise check all objects
-        for obj in context.scene.objects:
-            if obj.animation_data and obj.animation_data.action:
-                for fcurve in obj.animation_data.action.fcurves:
-                    for keyframe in fcurve.keyframe_points:
-                        # Make sure we're extracting an integer value
-                        frame_value = int(keyframe.co[0])
-                        keyframes.add(frame_value)
+        for _ in keyframe_scan.iter_scene_keyframes(context.scene.objects, keyframes):
+            pass
     except Exception as e:
         print(f"Error finding keyframes: {e}")
         
     # Convert the set to a sorted list of integers
-    return sorted(list(keyframes))
+    keyframes = sorted(list(keyframes))
+    profiling.add_items(len(keyframes))
+    return keyframes
 
-# Flag to track if scene has been initialized
-_scene_initialized = {}
+# Scenes initialized this session, keyed by scene_key (survives renames)
+_scene_initialized = set()
 
-# Handler for scene initialization only - lightweight, doesn't update UI list
-@bpy.app.handlers.persistent
+# Scene initialization - runs once per scene from load_post, registration or a scene switch
+@profiling.profiled()
 def initialize_scene_properties(scene):
     # Check if this scene has been initialized already
-    scene_name = scene.name
-    if scene_name in _scene_initialized and _scene_initialized[scene_name]:
+    key = scene_key(scene)
+    if key in _scene_initialized:
         return
     
     # Initialize properties for scene
     if hasattr(scene, "cascadeur_export"):
-        # Initialize marked_keyframes if empty
-        if not scene.cascadeur_export.marked_keyframes or scene.cascadeur_export.marked_keyframes == "":
-            scene.cascadeur_export.marked_keyframes = "{}"
+        # Move marks saved by older versions to the array format
+        migrate_marked_keyframes(scene)
         
         # Initialize list_filter if empty
         if hasattr(scene.cascadeur_export, "list_filter"):
@@ -225,17 +720,118 @@ def initialize_scene_properties(scene):
             update_timeline_markers(scene)
         
         # Mark scene as initialized
-        _scene_initialized[scene_name] = True
+        _scene_initialized.add(key)
         
         # Do an initial UI list update
         update_keyframe_list(scene)
         
-    print(f"Initialized scene: {scene_name}")
+    print(f"Initialized scene: {scene.name}")
+
+# Helper function to check if a scene still needs initializing
+def is_scene_initialized(scene):
+    return scene_key(scene) in _scene_initialized
 
-# Frame change handler - only updates timeline markers if needed
+# Helper function to get the scenes shown in windows (falls back to the context scene)
+def _visible_scenes():
+    scenes = []
+    window_manager = getattr(bpy.context, "window_manager", None)
+    if window_manager is not None:
+        for window in window_manager.windows:
+            if window.scene is not None and window.scene not in scenes:
+                scenes.append(window.scene)
+    if not scenes and getattr(bpy.context, "scene", None) is not None:
+        scenes.append(bpy.context.scene)
+    return scenes
+
+# Initialize every scene currently shown
+@profiling.profiled()
+def initialize_visible_scenes():
+    for scene in _visible_scenes():
+        initialize_scene_properties(scene)
+
+# Helper function to initialize a scene on the next tick (e.g. from a panel draw, where writing is not allowed)
+_initialization_requested = set()
+
+def request_scene_initialization(scene):
+    key = scene_key(scene)
+    if key in _initialization_requested:
+        return
+    _initialization_requested.add(key)
+    def initialize_later():
+        _initialization_requested.discard(key)
+        for target in bpy.data.scenes:
+            if scene_key(target) == key:
+                initialize_scene_properties(target)
+                break
+        return None
+    bpy.app.timers.register(initialize_later, first_interval=0.0)
+
+# Timer callback - initialize the open scenes once the add-on is registered
+# (the restricted registration context does not allow writing scene data)
+def initialize_after_register():
+    try:
+        initialize_visible_scenes()
+    except Exception as e:
+        print(f"Error initializing scenes: {e}")
+    return None
+
+# Owner of our message bus subscriptions
+_msgbus_owner = object()
+
+# Message bus callback - a window switched to another (possibly new) scene
+def _on_window_scene_changed():
+    initialize_visible_scenes()
+
+# Helper function to watch for scene switches; subscriptions are dropped on file load
+def subscribe_scene_changes():
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.Window, "scene"),
+        owner=_msgbus_owner,
+        args=(),
+        notify=_on_window_scene_changed,
+    )
+
+def unsubscribe_scene_changes():
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+
+# Load handler - forget old scene identities, re-subscribe and initialize the loaded scenes
 @bpy.app.handlers.persistent
+@profiling.profiled()
+def on_file_loaded(*args):
+    _scene_initialized.clear()
+    subscribe_scene_changes()
+    for scene in bpy.data.scenes:
+        if hasattr(scene, "cascadeur_export"):
+            migrate_marked_keyframes(scene)
+    initialize_visible_scenes()
+
+# Frame change handler - only touches timeline markers when the marked set changed
+@bpy.app.handlers.persistent
+@profiling.profiled()
 def update_on_frame_change(scene):
     # Only update timeline markers if showing markers is enabled
     if hasattr(scene, "cascadeur_export") and scene.cascadeur_export.show_markers:
-        # No need to update the whole list, just ensure correct markers are shown
+        # Nothing to do during playback/scrubbing unless the marks changed,
+        # and pending changes are left to the refresh scheduler
+        if timeline_markers_in_sync(scene) or refresh_scheduler.is_pending(scene, refresh_scheduler.MARKERS):
+            return
         update_timeline_markers(scene)
+
+# Load/undo handler - markers and scene identities may have changed under us
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def reset_marker_sync(*args):
+    _marker_sync.clear()
+
+# Load/undo handler - the list items were restored from the file, the frame arrays may not match
+@bpy.app.handlers.persistent
+@profiling.profiled()
+def reset_keyframe_list_frames(*args):
+    _keyframe_list_frames.clear()
+    _keyframe_list_pages.clear()
+    # A paginated list only holds one page of items, rebuild the full frame array
+    for scene in bpy.data.scenes:
+        settings = getattr(scene, "cascadeur_export", None)
+        if settings is not None and settings.paginate_list:
+            refresh_scheduler.request(scene, refresh_scheduler.LIST)